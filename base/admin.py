@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Location, Work, Notice, Notification, Feedback, Report
+from .models import User, Location, Work, ConflictGroup, WorkConflict, Notice, Notification, Feedback, Report
 
 
 @admin.register(User)
@@ -20,6 +20,18 @@ class WorkAdmin(admin.ModelAdmin):
 	search_fields = ("name", "details", "tag", "status")
 
 
+@admin.register(ConflictGroup)
+class ConflictGroupAdmin(admin.ModelAdmin):
+	list_display = ("work", "group_id")
+	search_fields = ("work__name", "group_id")
+
+
+@admin.register(WorkConflict)
+class WorkConflictAdmin(admin.ModelAdmin):
+	list_display = ("uuid", "work_a", "work_b", "kind", "distance", "overlap_length", "overlap_area", "overlap_days", "created_at", "updated_at")
+	search_fields = ("work_a__name", "work_b__name")
+
+
 @admin.register(Notice)
 class NoticeAdmin(admin.ModelAdmin):
 	list_display = ("uuid", "ordinance_no", "name", "created_by", "created_at", "updated_at")
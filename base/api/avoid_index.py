@@ -0,0 +1,261 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .route_cache import LocalLRUCache
+
+# ---------- Avoid-area index cache ----------
+#
+# Building the avoid set means scanning every matching Work, taking its
+# extent, scaling it and loading the result into an rtree. That only changes
+# when a Work or Location is written, so each worker keeps the built index per
+# (city, statuses, distinct) filter and reuses it until a global version
+# counter moves on. Work/Location writes bump the counter once committed
+# (see base/signals.py). Per-request subsets (within()) are views on the
+# cached index, nothing is rebuilt for them.
+#
+# The counter lives in a Django cache alias ("shared" in settings, backed by
+# the database or Redis) so a write invalidates every worker at once. With a
+# per-process backend (LocMem) writes in one worker only invalidate that
+# worker, and TTL bounds how stale the others can get.
+#
+# settings.AVOID_INDEX (all keys optional):
+#   {"ENABLED": True, "ALIAS": "default", "TTL": 300, "MAX_ENTRIES": 32}
+
+DEFAULTS = {
+    "ENABLED": True,
+    "ALIAS": "default",
+    "TTL": 300,
+    "MAX_ENTRIES": 32,
+}
+
+VERSION_KEY = "avoid_index:version"
+
+
+def _config() -> Dict[str, Any]:
+    return {**DEFAULTS, **getattr(settings, "AVOID_INDEX", {})}
+
+
+def avoid_index_version() -> int:
+    return caches[_config()["ALIAS"]].get(VERSION_KEY, 0)
+
+
+def bump_avoid_index_version() -> None:
+    """Called after every Work/Location write; cached indexes built before are dropped on next use."""
+    cache = caches[_config()["ALIAS"]]
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # missing (first write, or evicted): any value differs from what
+        # readers saw as the 0 default
+        cache.set(VERSION_KEY, int(time.time()), None)
+
+
+EXACT_BUFFER_M = 60.0   # same safety pad scale_rect_reasonably puts around the extent
+
+
+class AvoidIndex:
+    """
+    Scaled avoid rectangles plus the rtree built over them. In exact mode each
+    rectangle also carries the work's real shape buffered by EXACT_BUFFER_M
+    (WKB, 4326); collisions are then tested against that shape, the rectangle
+    only prunes candidates (the buffered shape always lies inside it).
+    """
+    def __init__(self, scaled_specs: List[List[float]], shapes: Optional[List[bytes]] = None):
+        from .shortest_path_utils import build_rect_index_from_array_of_arrays
+
+        # a single far-away dummy keeps the rtree and TomTom body non-empty
+        self.specs = [list(r[:4]) for r in scaled_specs] or [[1, 1, 1, 1]]
+        self.shapes = list(shapes) if shapes is not None and scaled_specs else None
+        self.idx, self.rects = build_rect_index_from_array_of_arrays(self.specs)
+        self.members = range(len(self.specs))
+        self.digest = hashlib.sha1(json.dumps([
+            sorted(tuple(round(float(v), 6) for v in r) for r in self.specs),
+            self.exact,
+        ]).encode()).hexdigest()
+        self._prepared: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_extents(cls, rect_specs: List[List[float]], shapes: Optional[List[bytes]] = None) -> "AvoidIndex":
+        """Raw work extents -> index over their 'just-big-enough' scaled rectangles."""
+        from .shortest_path_utils import scale_rect_reasonably
+
+        scaled = [scale_rect_reasonably(r[:4], min_w_m=120, min_h_m=120, safety_pad_m=60) for r in rect_specs]
+        return cls(scaled, shapes)
+
+    @property
+    def exact(self) -> bool:
+        return self.shapes is not None
+
+    def within(self, bbox) -> "AvoidIndex":
+        """Only the rectangles touching bbox [minLon, minLat, maxLon, maxLat], see AvoidIndexView."""
+        return AvoidIndexView(self, sorted(self.idx.intersection(tuple(bbox))))
+
+    def prepared(self, i):
+        """(shape, prepared shape) of rect i, built once per index entry."""
+        item = self._prepared.get(i)
+        if item is None:
+            from django.contrib.gis.geos import GEOSGeometry
+
+            geom = GEOSGeometry(memoryview(self.shapes[i]), srid=4326)
+            with self._lock:
+                item = self._prepared.setdefault(i, (geom, geom.prepared))
+        return item
+
+    def exact_collisions(self, line_coords, chunk=64):
+        """
+        Collision dicts like path_collisions_with_rects, but one per shape the
+        route actually touches, at the first segment that touches it.
+        """
+        from django.contrib.gis.geos import LineString, Point as GPoint
+
+        from .shortest_path_utils import Point
+
+        if len(line_coords) < 2:
+            return []
+        # rtree prunes per chunk of segments, GEOS decides per candidate
+        candidates = set()
+        for c0 in range(0, len(line_coords) - 1, chunk):
+            part = line_coords[c0:c0 + chunk + 1]
+            xs, ys = [c[0] for c in part], [c[1] for c in part]
+            candidates.update(self.idx.intersection((min(xs), min(ys), max(xs), max(ys))))
+
+        route = LineString([tuple(c[:2]) for c in line_coords], srid=4326)
+        hits = []
+        for ridx in sorted(candidates):
+            shape, prepared = self.prepared(ridx)
+            if not prepared.intersects(route):
+                continue
+            xmin, ymin, xmax, ymax = self.rects[ridx].bbox()
+            for i in range(len(line_coords) - 1):
+                (ax, ay), (bx, by) = line_coords[i][:2], line_coords[i + 1][:2]
+                if max(ax, bx) < xmin or min(ax, bx) > xmax or max(ay, by) < ymin or min(ay, by) > ymax:
+                    continue
+                seg = LineString((ax, ay), (bx, by), srid=4326)
+                if not prepared.intersects(seg):
+                    continue
+                if prepared.intersects(GPoint(ax, ay, srid=4326)):
+                    t, (px, py) = 0.0, (ax, ay)
+                else:
+                    t = min(seg.project_normalized(p) for p in _points_of(shape.boundary.intersection(seg)))
+                    px, py = ax + t * (bx - ax), ay + t * (by - ay)
+                hits.append({'rect_id': self.rects[ridx].id, 'segment_index': i, 'hit_point': Point(px, py), 't': t})
+                break
+        hits.sort(key=lambda h: (h['segment_index'], h['t']))
+        return hits
+
+    def collisions(self, geojson_geom):
+        """Route collisions, exact when shapes are loaded, else on the rectangles."""
+        from .shortest_path_utils import path_or_multiline_collisions
+
+        if not self.exact:
+            return path_or_multiline_collisions(self.idx, self.rects, geojson_geom)
+        typ = geojson_geom.get("type")
+        if typ == "LineString":
+            return self.exact_collisions(geojson_geom["coordinates"])
+        if typ == "MultiLineString":
+            return [h for part in geojson_geom["coordinates"] for h in self.exact_collisions(part)]
+        raise ValueError("Only LineString or MultiLineString are supported.")
+
+    def __len__(self):
+        return len(self.members)
+
+
+class AvoidIndexView(AvoidIndex):
+    """
+    Some rectangles of a built index. Specs, rects and the rtree are the
+    parent's (so rect ids stay valid); queries skip the other entries.
+    """
+    def __init__(self, parent: AvoidIndex, members: List[int]):
+        self.specs, self.shapes, self.rects = parent.specs, parent.shapes, parent.rects
+        self.idx = _SubsetIndex(parent.idx, members)
+        self.members = members
+        self.digest = hashlib.sha1(f"{parent.digest}:{members}".encode()).hexdigest()
+        # prepared shapes are keyed by parent position: built once per cached
+        # entry, then reused by every request and batch pair
+        self._prepared, self._lock = parent._prepared, parent._lock
+
+
+class _SubsetIndex:
+    """The part of an rtree's interface the collision code uses, restricted to some entry ids."""
+    def __init__(self, idx, ids):
+        self._idx = idx
+        self._ids = frozenset(ids)
+
+    def intersection(self, bbox):
+        return (i for i in self._idx.intersection(bbox) if i in self._ids)
+
+
+def _points_of(geom):
+    """Every vertex of a GEOS geometry, as Points (intersection results can be any type)."""
+    from django.contrib.gis.geos import Point as GPoint
+
+    if geom.empty:
+        return []
+    if geom.geom_type == "Point":
+        return [geom]
+    if geom.geom_type in ("LineString", "LinearRing"):
+        return [GPoint(c, srid=geom.srid) for c in geom.coords]
+    return [p for part in geom for p in _points_of(part)]
+
+
+class AvoidIndexCache:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._data: Optional[LocalLRUCache] = None
+        self._lock = threading.Lock()
+
+    def _backend(self, cfg) -> LocalLRUCache:
+        with self._lock:
+            if self._data is None or self._data.max_entries != cfg["MAX_ENTRIES"]:
+                self._data = LocalLRUCache(cfg["MAX_ENTRIES"])
+            return self._data
+
+    def get_or_build(self, key: Tuple, loader: Callable[[], Tuple[List[List[float]], Optional[List[bytes]]]]) -> AvoidIndex:
+        """
+        key:    hashable filter description, e.g. (city, statuses, distinct)
+        loader: returns (raw unscaled rect specs, buffered shapes or None),
+                only called on a miss
+        """
+        cfg = _config()
+        if not cfg["ENABLED"]:
+            return AvoidIndex.from_extents(*loader())
+        version = avoid_index_version()
+        data = self._backend(cfg)
+        item = data.get(key)
+        with self._lock:
+            if item is not None and item[0] == version:
+                self.hits += 1
+                return item[1]
+            self.misses += 1
+
+        entry = AvoidIndex.from_extents(*loader())
+        data.set(key, (version, entry), cfg["TTL"])
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._data is not None:
+                self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data) if self._data is not None else 0,
+            "version": avoid_index_version(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+# one per worker process
+avoid_index_cache = AvoidIndexCache()
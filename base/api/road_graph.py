@@ -0,0 +1,327 @@
+import bz2
+import gzip
+import heapq
+import math
+import pickle
+import re
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from rtree import index
+
+from .shortest_path_utils import (
+    Point,
+    Rectangle,
+    first_hit_with_rect,
+    parse_latlon,
+    to_geojson_from_points,
+)
+
+# ---------- Offline road-graph routing ----------
+#
+# Drop-in replacement for the TomTom call when settings.ROUTING_BACKEND is
+# "osm". The road network of an OSM XML extract (.osm, .osm.gz, .osm.bz2) is
+# loaded once per process into a compact CSR graph: node coordinates and
+# per-edge target / length / travel time live in flat arrays. A route is one
+# A* query (travel time, straight-line-at-top-speed heuristic) with every edge
+# that runs through an avoid rectangle masked out, so avoidance is an
+# in-memory filter instead of a re-request loop.
+#
+# Loading XML is slow for a whole city; `python manage.py build_road_graph`
+# converts an extract once into a pickled .graph file that loads in seconds.
+#
+# settings.ROAD_GRAPH_PATH points at either file.
+
+# free-flow speeds (km/h) when a way has no usable maxspeed
+HIGHWAY_SPEEDS = {
+    "motorway": 80, "motorway_link": 50,
+    "trunk": 60, "trunk_link": 40,
+    "primary": 45, "primary_link": 35,
+    "secondary": 35, "secondary_link": 30,
+    "tertiary": 30, "tertiary_link": 25,
+    "unclassified": 25, "residential": 20,
+    "living_street": 10, "service": 15, "road": 20,
+}
+NO_ACCESS = {"no", "private"}
+EARTH_RADIUS_M = 6_371_008.8
+
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _open_extract(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def _speed_kmh(tags):
+    raw = tags.get("maxspeed", "")
+    m = re.match(r"\s*(\d+(?:\.\d+)?)\s*(mph)?", raw)
+    if m and float(m.group(1)) > 0:   # maxspeed=0 does occur in OSM data
+        v = float(m.group(1))
+        return v * 1.609344 if m.group(2) else v
+    return HIGHWAY_SPEEDS[tags["highway"]]
+
+
+def _direction(tags):
+    """(forward, backward) travel allowed along the node order of the way."""
+    oneway = tags.get("oneway", "")
+    if oneway == "-1":
+        return False, True
+    if oneway in ("yes", "1", "true"):
+        return True, False
+    if oneway == "no":
+        return True, True
+    implied = tags.get("junction") in ("roundabout", "circular") or tags["highway"] in ("motorway", "motorway_link")
+    return True, not implied
+
+
+class RoadGraph:
+    """
+    Directed road graph in CSR form. Node i sits at (lon[i], lat[i]); its
+    outgoing edges are offsets[i] .. offsets[i + 1] - 1, edge e goes to
+    target[e] and takes length_m[e] meters / time_s[e] seconds.
+    """
+    def __init__(self, lon, lat, offsets, target, length_m, time_s):
+        self.lon, self.lat = lon, lat
+        self.offsets, self.target = offsets, target
+        self.length_m, self.time_s = length_m, time_s
+        self.max_speed_ms = max(
+            (length_m[e] / time_s[e] for e in range(len(target)) if time_s[e] > 0), default=1.0
+        )
+        self._node_index = None
+        self._edge_index = None
+        self._lock = threading.Lock()
+
+    @property
+    def node_count(self):
+        return len(self.lon)
+
+    @property
+    def edge_count(self):
+        return len(self.target)
+
+    # -- build / persist --
+
+    @classmethod
+    def from_osm(cls, path):
+        # pass 1: drivable ways (OSM XML lists nodes first, but we only want
+        # the coordinates of nodes some drivable way uses)
+        ways = []
+        needed = set()
+        for _, elem in ET.iterparse(_open_extract(path), events=("end",)):
+            if elem.tag == "way":
+                tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+                if tags.get("highway") in HIGHWAY_SPEEDS and tags.get("access") not in NO_ACCESS \
+                        and tags.get("motor_vehicle") not in NO_ACCESS:
+                    refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                    if len(refs) > 1:
+                        ways.append((refs, _speed_kmh(tags) / 3.6, _direction(tags)))
+                        needed.update(refs)
+                elem.clear()
+            elif elem.tag in ("node", "relation"):
+                elem.clear()
+
+        # pass 2: coordinates of those nodes, numbered compactly
+        node_id, lon, lat = {}, array("d"), array("d")
+        for _, elem in ET.iterparse(_open_extract(path), events=("end",)):
+            if elem.tag == "node":
+                osm_id = int(elem.get("id"))
+                if osm_id in needed:
+                    node_id[osm_id] = len(lon)
+                    lon.append(float(elem.get("lon")))
+                    lat.append(float(elem.get("lat")))
+            elem.clear()
+
+        edges = []
+        for refs, speed_ms, (fwd, bwd) in ways:
+            ids = [node_id[r] for r in refs if r in node_id]
+            for u, v in zip(ids, ids[1:]):
+                if u == v:
+                    continue
+                d = haversine_m(lon[u], lat[u], lon[v], lat[v])
+                if fwd:
+                    edges.append((u, v, d, d / speed_ms))
+                if bwd:
+                    edges.append((v, u, d, d / speed_ms))
+        return cls._from_edges(lon, lat, edges)
+
+    @classmethod
+    def _from_edges(cls, lon, lat, edges):
+        edges.sort(key=lambda e: e[0])
+        offsets = array("l", [0] * (len(lon) + 1))
+        for u, _, _, _ in edges:
+            offsets[u + 1] += 1
+        for i in range(len(lon)):
+            offsets[i + 1] += offsets[i]
+        target = array("l", (e[1] for e in edges))
+        length_m = array("d", (e[2] for e in edges))
+        time_s = array("d", (e[3] for e in edges))
+        return cls(lon, lat, offsets, target, length_m, time_s)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(
+                {k: getattr(self, k) for k in ("lon", "lat", "offsets", "target", "length_m", "time_s")},
+                f, protocol=pickle.HIGHEST_PROTOCOL,
+            )
+
+    @classmethod
+    def load(cls, path):
+        """A .graph file written by save(), or an OSM XML extract."""
+        if path.endswith(".graph"):
+            with open(path, "rb") as f:
+                return cls(**pickle.load(f))
+        return cls.from_osm(path)
+
+    # -- spatial lookups (built on first use) --
+
+    def _nodes(self):
+        with self._lock:
+            if self._node_index is None:
+                self._node_index = index.Index(
+                    (i, (x, y, x, y), None) for i, (x, y) in enumerate(zip(self.lon, self.lat))
+                )
+            return self._node_index
+
+    def _edges(self):
+        with self._lock:
+            if self._edge_index is None:
+                def gen():
+                    for u in range(self.node_count):
+                        x0, y0 = self.lon[u], self.lat[u]
+                        for e in range(self.offsets[u], self.offsets[u + 1]):
+                            v = self.target[e]
+                            x1, y1 = self.lon[v], self.lat[v]
+                            yield (e, (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)), u)
+                self._edge_index = index.Index(gen())
+            return self._edge_index
+
+    def nearest_node(self, lon, lat):
+        return next(self._nodes().nearest((lon, lat, lon, lat), 1))
+
+    def blocked_edges(self, avoid_index):
+        """
+        Ids of the edges that run through any avoid rectangle, or through its
+        buffered shape when the index is exact.
+        """
+        from django.contrib.gis.geos import LineString
+
+        blocked = set()
+        edge_index = self._edges()
+        for i in avoid_index.members:
+            rect = Rectangle(*avoid_index.specs[i][:4], rect_id=None)
+            prepared = avoid_index.prepared(i)[1] if avoid_index.exact else None
+            for item in edge_index.intersection(rect.bbox(), objects=True):
+                u, v = item.object, self.target[item.id]
+                if prepared is not None:
+                    hit = prepared.intersects(LineString(
+                        (self.lon[u], self.lat[u]), (self.lon[v], self.lat[v]), srid=4326,
+                    ))
+                else:
+                    a, b = Point(self.lon[u], self.lat[u]), Point(self.lon[v], self.lat[v])
+                    hit = first_hit_with_rect(a, b, rect)[0] is not None
+                if hit:
+                    blocked.add(item.id)
+        return blocked
+
+    # -- query --
+
+    def shortest_path(self, src, dst, blocked=frozenset()) -> Optional[List[int]]:
+        """Fastest node path src -> dst avoiding `blocked` edge ids, or None."""
+        lon, lat, off, tgt, w = self.lon, self.lat, self.offsets, self.target, self.time_s
+        dlon, dlat, vmax = lon[dst], lat[dst], self.max_speed_ms
+
+        def h(n):
+            return haversine_m(lon[n], lat[n], dlon, dlat) / vmax
+
+        best = {src: 0.0}
+        prev = {}
+        heap = [(h(src), 0.0, src)]
+        while heap:
+            _, g, u = heapq.heappop(heap)
+            if u == dst:
+                path = [dst]
+                while path[-1] != src:
+                    path.append(prev[path[-1]])
+                return path[::-1]
+            if g > best[u]:
+                continue
+            for e in range(off[u], off[u + 1]):
+                if e in blocked:
+                    continue
+                v = tgt[e]
+                ng = g + w[e]
+                if ng < best.get(v, math.inf):
+                    best[v] = ng
+                    prev[v] = u
+                    heapq.heappush(heap, (ng + h(v), ng, v))
+        return None
+
+    def path_summary(self, path):
+        length = travel = 0.0
+        for u, v in zip(path, path[1:]):
+            # cheapest parallel edge u -> v, the one A* relaxed
+            e = min(
+                (e for e in range(self.offsets[u], self.offsets[u + 1]) if self.target[e] == v),
+                key=lambda e: self.time_s[e],
+            )
+            length += self.length_m[e]
+            travel += self.time_s[e]
+        return {
+            "lengthInMeters": int(round(length)),
+            "travelTimeInSeconds": int(round(travel)),
+            "trafficDelayInSeconds": 0,
+        }
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_road_graph() -> RoadGraph:
+    """Graph from settings.ROAD_GRAPH_PATH, loaded once per process."""
+    from django.conf import settings
+
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            path = getattr(settings, "ROAD_GRAPH_PATH", "")
+            if not path:
+                raise RuntimeError("ROUTING_BACKEND is 'osm' but ROAD_GRAPH_PATH is not set")
+            _graph = RoadGraph.load(path)
+        return _graph
+
+
+def offline_route(avoid_index, orig_str, dest_str, graph: Optional[RoadGraph] = None) -> Tuple[Dict, Dict, List[Dict]]:
+    """
+    Same (geometry, geojson) pair merger() returns, plus the collision
+    records of the avoid rectangles the route still runs through. Every avoid
+    rectangle is masked at once; if that leaves no path, the unmasked fastest
+    route is returned, like the TomTom loop does when it runs out of iterations.
+    """
+    graph = graph or get_road_graph()
+    olat, olon = parse_latlon(orig_str)
+    dlat, dlon = parse_latlon(dest_str)
+    src, dst = graph.nearest_node(olon, olat), graph.nearest_node(dlon, dlat)
+
+    path = graph.shortest_path(src, dst, graph.blocked_edges(avoid_index))
+    if path is None:
+        path = graph.shortest_path(src, dst)
+    if path is None:
+        raise RuntimeError("No road connects origin and destination in the loaded graph")
+
+    points = [{"latitude": graph.lat[n], "longitude": graph.lon[n]} for n in path]
+    gj = to_geojson_from_points(points, props=graph.path_summary(path))
+    geometry = gj["features"][0]["geometry"]
+    collisions = avoid_index.collisions(geometry) if len(path) > 1 else []
+    return geometry, gj, collisions
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+# ---------- Route result cache ----------
+#
+# Solved routes are keyed by the rounded origin/destination, a hash of the
+# scaled avoid rectangles and a traffic time bucket, so the same trip asked
+# again within a few minutes skips the TomTom round trips entirely.
+#
+# Two backends:
+#   "local"  - per-worker LRU with TTL and a hard size bound
+#   "django" - any Django cache alias (LocMem, Redis, Memcached...), shared
+#              between workers when the alias is; TTL and eviction are the
+#              backend's
+#
+# settings.ROUTE_CACHE (all keys optional):
+#   {"BACKEND": "local", "ALIAS": "default", "TTL": 120, "MAX_ENTRIES": 512,
+#    "TRAFFIC_BUCKET_SECONDS": 300, "COORD_PRECISION": 4, "ENABLED": True}
+
+DEFAULTS = {
+    "ENABLED": True,
+    "BACKEND": "local",
+    "ALIAS": "default",
+    "TTL": 120,
+    "MAX_ENTRIES": 512,
+    "TRAFFIC_BUCKET_SECONDS": 300,
+    "COORD_PRECISION": 4,
+}
+
+
+def _config() -> Dict[str, Any]:
+    return {**DEFAULTS, **getattr(settings, "ROUTE_CACHE", {})}
+
+
+class LocalLRUCache:
+    """Thread-safe LRU with per-entry expiry."""
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RouteCache:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._local: Optional[LocalLRUCache] = None
+        self._lock = threading.Lock()
+
+    # -- key --
+
+    @staticmethod
+    def _round_latlon(s: str, precision: int) -> str:
+        lat, lon = (float(v) for v in s.split(","))
+        return f"{lat:.{precision}f},{lon:.{precision}f}"
+
+    def make_key(
+        self,
+        orig_str: str,
+        dest_str: str,
+        avoid_rects: List[List[float]],
+        now: Optional[float] = None,
+        avoid_hash: Optional[str] = None,
+        simplify_m: float = 0.0,
+    ) -> str:
+        """
+        avoid_hash: precomputed digest of avoid_rects (e.g. AvoidIndex.digest), skips rehashing them.
+        simplify_m: collision-check tolerance the route was accepted under.
+        """
+        cfg = _config()
+        precision = cfg["COORD_PRECISION"]
+        if avoid_hash is None:
+            rects = sorted(tuple(round(float(v), 6) for v in r[:4]) for r in avoid_rects)
+            avoid_hash = hashlib.sha1(json.dumps(rects).encode()).hexdigest()
+        bucket = int((now if now is not None else time.time()) // cfg["TRAFFIC_BUCKET_SECONDS"])
+        return "route:{}:{}:{}:{}:{:g}".format(
+            self._round_latlon(orig_str, precision),
+            self._round_latlon(dest_str, precision),
+            avoid_hash,
+            bucket,
+            float(simplify_m or 0.0),
+        )
+
+    # -- storage --
+
+    def _backend(self):
+        cfg = _config()
+        if cfg["BACKEND"] == "django":
+            return caches[cfg["ALIAS"]]
+        with self._lock:
+            if self._local is None or self._local.max_entries != cfg["MAX_ENTRIES"]:
+                self._local = LocalLRUCache(cfg["MAX_ENTRIES"])
+            return self._local
+
+    def get(self, key: str):
+        if not _config()["ENABLED"]:
+            return None
+        value = self._backend().get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value) -> None:
+        cfg = _config()
+        if cfg["ENABLED"]:
+            self._backend().set(key, value, cfg["TTL"])
+
+    def clear(self) -> None:
+        backend = self._backend()
+        if isinstance(backend, LocalLRUCache):
+            backend.clear()
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        cfg = _config()
+        total = self.hits + self.misses
+        out = {
+            "backend": cfg["BACKEND"],
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "ttl": cfg["TTL"],
+        }
+        if self._local is not None and cfg["BACKEND"] == "local":
+            out.update(size=len(self._local), max_entries=self._local.max_entries, evictions=self._local.evictions)
+        return out
+
+
+# one per worker process
+route_cache = RouteCache()
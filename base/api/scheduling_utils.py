@@ -0,0 +1,133 @@
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# ---------- Conflict-free scheduling of proposed works ----------
+#
+# Days are plain integers (date.toordinal()) and a job occupies the half-open
+# interval [start, start + duration). Two jobs joined by a conflict edge must
+# not overlap; works that are already fixed in time (Planned/Ongoing) show up
+# as blocked intervals on the jobs they conflict with.
+#
+# Heuristic: greedy list scheduling (Emergency first, then earliest release)
+# where each job takes the earliest free slot among its already-placed
+# neighbours, followed by an iterated-greedy local search that ages the
+# priority of late jobs and keeps a result only if weighted tardiness drops.
+
+INF = math.inf
+EMERGENCY_WEIGHT = 10
+
+
+class Job:
+    __slots__ = ("id", "duration", "release", "due", "emergency", "start")
+    def __init__(self, job_id, duration: int, release: int, due: int, emergency: bool = False):
+        self.id = job_id
+        self.duration = max(1, int(duration))
+        self.release = int(release)
+        self.due = int(due)             # last day it should occupy (inclusive)
+        self.emergency = bool(emergency)
+        self.start: Optional[int] = None
+    @property
+    def end(self): return self.start + self.duration
+    def tardiness(self):
+        if self.start is None:
+            return INF
+        late = max(0, self.end - 1 - self.due)
+        return late * (EMERGENCY_WEIGHT if self.emergency else 1)
+    def __repr__(self): return f"Job({self.id}, start={self.start}, d={self.duration})"
+
+
+def earliest_fit(release: int, duration: int, busy: List[Tuple[float, float]]) -> Optional[int]:
+    """
+    Earliest t >= release such that [t, t + duration) misses every interval
+    in `busy` (half-open, sorted by start). None if an open-ended block
+    makes it impossible.
+    """
+    t = release
+    for s, e in busy:
+        if e <= t:
+            continue
+        if s >= t + duration:
+            break
+        t = e
+        if t == INF:
+            return None
+    return int(t)
+
+
+def split_neighbours(job_ids, rows) -> Tuple[List[Tuple], Dict]:
+    """
+    rows: (job id, neighbour id, first day, day after last) for every work
+    spatially close to a job; days are dates or None. Neighbours that are
+    jobs themselves become edges (each pair once), the others are blocked
+    intervals on the job, open-ended when the end is None.
+    Returns (edges, fixed) as solve_schedule takes them.
+    """
+    edges, fixed = set(), {}
+    for job_id, other, lower, upper in rows:
+        if other in job_ids:
+            edges.add((job_id, other) if str(job_id) < str(other) else (other, job_id))
+        elif lower is not None:
+            span = (lower.toordinal(), upper.toordinal() if upper is not None else INF)
+            fixed.setdefault(job_id, []).append(span)
+    return sorted(edges, key=lambda e: (str(e[0]), str(e[1]))), fixed
+
+
+def _greedy(order: List[Job], adj: Dict, fixed: Dict):
+    placed = {}
+    for job in order:
+        busy = list(fixed.get(job.id, ()))
+        for n in adj.get(job.id, ()):
+            other = placed.get(n)
+            if other is not None and other.start is not None:
+                busy.append((other.start, other.end))
+        busy.sort()
+        job.start = earliest_fit(job.release, job.duration, busy)
+        placed[job.id] = job
+
+
+def _cost(jobs: Iterable[Job]):
+    return sum(j.tardiness() for j in jobs)
+
+
+def solve_schedule(
+    jobs: List[Job],
+    edges: Iterable[Tuple],
+    fixed: Optional[Dict] = None,
+    rounds: int = 4,
+) -> Dict:
+    """
+    jobs:  Job objects to place
+    edges: (id_a, id_b) conflict pairs between jobs
+    fixed: {job id: [(start, end), ...]} blocked intervals per job, end may be INF
+    Returns {job id: start day or None}, and leaves job.start set.
+    """
+    fixed = fixed or {}
+    adj: Dict = {}
+    for a, b in edges:
+        adj.setdefault(a, []).append(b)
+        adj.setdefault(b, []).append(a)
+
+    order = sorted(jobs, key=lambda j: (not j.emergency, j.release, -j.duration, str(j.id)))
+    _greedy(order, adj, fixed)
+    best_cost = _cost(jobs)
+    best = {j.id: j.start for j in jobs}
+
+    # local search: late jobs get their priority aged by how late they ended
+    # up, so they claim their slot before the neighbours that pushed them out
+    boost = {j.id: 0 for j in jobs}
+    for _ in range(rounds):
+        if best_cost == 0:
+            break
+        for j in jobs:
+            if j.start is not None:
+                boost[j.id] += max(0, j.end - 1 - j.due)
+        order = sorted(order, key=lambda j: (not j.emergency, j.release - boost[j.id]))
+        _greedy(order, adj, fixed)
+        cost = _cost(jobs)
+        if cost < best_cost:
+            best_cost = cost
+            best = {j.id: j.start for j in jobs}
+
+    for j in jobs:
+        j.start = best[j.id]
+    return best
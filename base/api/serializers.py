@@ -1,6 +1,11 @@
+import json
+
+from django.contrib.gis.gdal import GDALException
+from django.contrib.gis.geos import GEOSException, GEOSGeometry
 from rest_framework import serializers
 from rest_framework_simplejwt.tokens import RefreshToken
-from base.models import User, Location, Work, Notice, Notification, Feedback, Report
+from base.conflicts import conflict_map
+from base.models import User, Location, Work, WorkConflict, Notice, Notification, Feedback, Report
 
 
 
@@ -58,16 +63,41 @@ class LocationSerializer(serializers.ModelSerializer):
 
 
 
+class WorkListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # resolve every work's conflicts in one query instead of one per work
+        works = list(data.all() if hasattr(data, "all") else data)
+        if "conflict_map" not in self.context:
+            self.context["conflict_map"] = conflict_map([w.pk for w in works])
+        return super().to_representation(works)
+
+
 class WorkSerializer(serializers.ModelSerializer):
+    conflicts = serializers.SerializerMethodField()
+    near_conflicts = serializers.SerializerMethodField()
+
     class Meta:
         model = Work
+        list_serializer_class = WorkListSerializer
         fields = [
             "uuid", "stakeholder", "location", "name", "details", "tag", "status",
             "estimated_time", "proposed_start_date", "proposed_end_date",
-            "start_date", "end_date", "budget", "conflicts",
+            "start_date", "end_date", "budget", "conflicts", "near_conflicts",
             "created_at", "updated_at"
         ]
 
+    def _conflicts_of_kind(self, obj, kind):
+        cached = self.context.get("conflict_map")
+        if cached is not None and obj.pk in cached:
+            return [str(pk) for pk, k in cached[obj.pk] if k == kind]
+        return [str(pk) for pk in obj.conflict_ids(kind)]
+
+    def get_conflicts(self, obj):
+        return self._conflicts_of_kind(obj, "Intersect")
+
+    def get_near_conflicts(self, obj):
+        return self._conflicts_of_kind(obj, "Near")
+
     def create(self, validated_data):
         request = self.context.get('request')
         if request and hasattr(request, 'user') and request.user.is_authenticated:
@@ -79,6 +109,53 @@ class WorkSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class WorkConflictSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WorkConflict
+        fields = [
+            "uuid", "work_a", "work_b", "kind", "distance", "overlap_length", "overlap_area", "overlap_days",
+            "created_at", "updated_at"
+        ]
+
+
+class GeometryInputField(serializers.JSONField):
+    """Accepts a GeoJSON geometry object or a WKT/EWKT string, returns a GEOSGeometry."""
+    def to_internal_value(self, data):
+        data = super().to_internal_value(data)
+        try:
+            return GEOSGeometry(data if isinstance(data, str) else json.dumps(data))
+        except (ValueError, TypeError, GEOSException, GDALException):
+            raise serializers.ValidationError("Invalid geometry.")
+
+
+class ConflictCandidateSerializer(serializers.Serializer):
+    geom = GeometryInputField(help_text="GeoJSON geometry or WKT string")
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+
+    def validate(self, data):
+        if data["end_date"] < data["start_date"]:
+            raise serializers.ValidationError("end_date must not be before start_date.")
+        return data
+
+
+class ConflictCheckSerializer(serializers.Serializer):
+    MAX_CANDIDATES = 500
+
+    candidates = ConflictCandidateSerializer(many=True, allow_empty=False, max_length=MAX_CANDIDATES)
+
+
+class EarliestWindowSerializer(serializers.Serializer):
+    geom = GeometryInputField(help_text="GeoJSON geometry or WKT string")
+    estimated_time = serializers.DurationField()
+    not_before = serializers.DateField(required=False)
+
+    def validate_estimated_time(self, value):
+        if value.total_seconds() <= 0:
+            raise serializers.ValidationError("estimated_time must be positive.")
+        return value
+
+
 class NoticeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notice
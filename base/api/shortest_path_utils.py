@@ -2,9 +2,23 @@
 from rtree import index
 import os, sys, json, argparse, requests
 from typing import Dict, Any, List, Optional
+import logging
 import math
+import random
+import threading
+import time
+from collections import deque
 from copy import deepcopy
+from requests.adapters import HTTPAdapter
+try:
+    import numpy as np
+except ImportError:  # scalar collision checks only
+    np = None
 from rest_framework.exceptions import APIException
+from .avoid_index import AvoidIndex
+from .route_cache import route_cache
+
+logger = logging.getLogger(__name__)
 
 # ---------- Geometry primitives ----------
 
@@ -112,30 +126,99 @@ def build_rect_index_from_array_of_arrays(rect_specs):
 def segment_bbox(a, b):
     return (min(a.x, b.x), min(a.y, b.y), max(a.x, b.x), max(a.y, b.y))
 
-def path_collisions_with_rects(rect_index, stored_rects, line_coords):
-    """
-    line_coords: list of [lon, lat] coordinates (LineString).
-    Returns list of collision dicts.
-    """
+# Rects entered within HIT_TIE_T of a segment's earliest hit are ties (the
+# two engines compute t along different routes and differ by a few ULPs of
+# the coordinates); the one that comes first in stored_rects wins, in both.
+HIT_TIE_T = 1e-9
+
+
+def _path_collisions_scalar(rect_index, stored_rects, line_coords):
+    """Reference implementation: one rtree query and four edge tests per segment."""
     hits = []
     for i in range(len(line_coords) - 1):
         a = Point(*line_coords[i])
         b = Point(*line_coords[i+1])
         qbb = segment_bbox(a, b)
-        candidates = list(rect_index.intersection(qbb))
-        if not candidates: 
+        found = []
+        for ridx in sorted(rect_index.intersection(qbb)):
+            t, pt = first_hit_with_rect(a, b, stored_rects[ridx])
+            if t is not None:
+                found.append((t, ridx, pt))
+        if not found:
+            continue
+        t_min = min(f[0] for f in found)
+        t, ridx, pt = next(f for f in found if f[0] <= t_min + HIT_TIE_T)
+        hits.append({'rect_id': stored_rects[ridx].id, 'segment_index': i, 'hit_point': pt, 't': t})
+    return hits
+
+# ---------- Vectorized collision engine ----------
+#
+# Same records as the scalar loop, computed with batched Liang–Barsky
+# clipping: the polyline is cut into chunks of COLLISION_CHUNK segments, each
+# chunk makes one rtree query with its bbox and all its segments are clipped
+# against all candidate rectangles at once. The entry parameter t of a
+# segment into a box is exactly the first edge hit the scalar code finds
+# (0 when the segment starts inside). Ties are broken as in the scalar code
+# (see HIT_TIE_T).
+
+COLLISION_CHUNK = 64
+VECTORIZE_MIN_SEGMENTS = 16   # below this numpy setup costs more than it saves
+
+
+def _path_collisions_vectorized(rect_index, stored_rects, line_coords):
+    pts = np.asarray(line_coords, dtype=float)[:, :2]
+    hits = []
+    for c0 in range(0, len(pts) - 1, COLLISION_CHUNK):
+        seg = pts[c0:c0 + COLLISION_CHUNK + 1]
+        ax, ay = seg[:-1, 0:1], seg[:-1, 1:2]           # (n, 1)
+        dx, dy = seg[1:, 0:1] - ax, seg[1:, 1:2] - ay
+
+        lo, hi = seg.min(axis=0), seg.max(axis=0)
+        cand = sorted(rect_index.intersection((lo[0], lo[1], hi[0], hi[1])))
+        if not cand:
             continue
-        best_t_for_seg, best_hit = None, None
-        for ridx in candidates:
-            rect = stored_rects[ridx]
-            t, pt = first_hit_with_rect(a, b, rect)
-            if t is not None and (best_t_for_seg is None or t < best_t_for_seg):
-                best_t_for_seg = t
-                best_hit = {'rect_id': rect.id, 'segment_index': i, 'hit_point': pt, 't': t}
-        if best_hit:
-            hits.append(best_hit)
+        boxes = np.array([stored_rects[i].bbox() for i in cand], dtype=float)
+        xmin, ymin, xmax, ymax = boxes.T                 # (k,)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t_enter = np.zeros((len(ax), len(cand)))
+            t_exit = np.ones((len(ax), len(cand)))
+            for a, d, bmin, bmax in ((ax, dx, xmin, xmax), (ay, dy, ymin, ymax)):
+                flat = np.abs(d) <= EPS
+                t1 = (bmin - a) / d
+                t2 = (bmax - a) / d
+                # a segment parallel to this axis is either inside the slab
+                # for its whole length or never
+                inside = (a >= bmin - EPS) & (a <= bmax + EPS)
+                t_near = np.where(flat, np.where(inside, -np.inf, np.inf), np.minimum(t1, t2))
+                t_far = np.where(flat, np.where(inside, np.inf, -np.inf), np.maximum(t1, t2))
+                t_enter = np.maximum(t_enter, t_near)
+                t_exit = np.minimum(t_exit, t_far)
+
+        t_enter = np.where(t_enter <= t_exit, t_enter, np.inf)
+        t_min = t_enter.min(axis=1)
+        # first column (cand is sorted) within HIT_TIE_T of the earliest entry
+        best = np.argmax(t_enter <= t_min[:, None] + HIT_TIE_T, axis=1)
+        best_t = t_enter[np.arange(len(ax)), best]
+        for j in np.flatnonzero(np.isfinite(best_t)):
+            t = float(best_t[j])
+            rect = stored_rects[cand[best[j]]]
+            px, py = float(ax[j, 0]), float(ay[j, 0])
+            pt = Point(px, py) if t == 0.0 else Point(px + t * float(dx[j, 0]), py + t * float(dy[j, 0]))
+            hits.append({'rect_id': rect.id, 'segment_index': c0 + int(j), 'hit_point': pt, 't': t})
     return hits
 
+
+def path_collisions_with_rects(rect_index, stored_rects, line_coords):
+    """
+    line_coords: list of [lon, lat] coordinates (LineString).
+    Returns list of collision dicts, at most one per segment (its earliest hit):
+      {'rect_id', 'segment_index', 'hit_point' (Point), 't' (0..1 along the segment)}
+    """
+    if np is None or len(line_coords) - 1 < VECTORIZE_MIN_SEGMENTS:
+        return _path_collisions_scalar(rect_index, stored_rects, line_coords)
+    return _path_collisions_vectorized(rect_index, stored_rects, line_coords)
+
 def path_or_multiline_collisions(rect_index, stored_rects, geojson_geom):
     typ = geojson_geom.get("type")
     if typ == "LineString":
@@ -157,6 +240,130 @@ def path_or_multiline_collisions(rect_index, stored_rects, geojson_geom):
 
 BASE = "https://api.tomtom.com/maps/orbis/routing/calculateRoute"
 
+
+def tomtom_base_url():
+    """settings.TOMTOM_BASE_URL when set (e.g. the local stand-in, see tomtom_standin.py), else TomTom."""
+    from django.conf import settings
+    return getattr(settings, "TOMTOM_BASE_URL", "") or BASE
+
+# ---------- Pooled HTTP client ----------
+#
+# One keep-alive session per worker process, so successive TomTom calls reuse
+# the TCP+TLS connection instead of handshaking every iteration. Transient
+# failures (429/5xx, connection errors, timeouts) are retried a bounded number
+# of times with full-jitter exponential backoff, honouring Retry-After.
+
+CONNECT_TIMEOUT = 3.05   # seconds to establish the connection
+READ_TIMEOUT = 27.0      # seconds to wait for the response body
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.25
+BACKOFF_CAP = 4.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """Module-level session, recreated after a fork (gunicorn preload)."""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            sess = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            sess.mount("https://", adapter)
+            sess.mount("http://", adapter)
+            _session, _session_pid = sess, os.getpid()
+        return _session
+
+
+class HttpStats:
+    """Per-worker call counters and a window of recent latencies (seconds)."""
+    def __init__(self, window: int = 1000):
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, retries: int, failed: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.retries += retries
+            self.failures += int(failed)
+            self.latencies.append(latency)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lat = sorted(self.latencies)
+            calls, retries, failures = self.calls, self.retries, self.failures
+        def pct(p):
+            return lat[min(len(lat) - 1, int(p * len(lat)))] if lat else None
+        return {
+            "calls": calls, "retries": retries, "failures": failures,
+            "latency_p50": pct(0.50), "latency_p95": pct(0.95), "latency_max": lat[-1] if lat else None,
+        }
+
+
+http_stats = HttpStats()
+
+
+def _backoff_delay(attempt: int, response=None) -> float:
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(BACKOFF_CAP, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _timeout_within(timeout, deadline):
+    """(connect, read) timeout cut down to what is left until deadline (time.monotonic())."""
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise requests.Timeout("Routing time budget exhausted")
+    return min(timeout[0], remaining), min(timeout[1], remaining)
+
+
+def _fits(delay, deadline):
+    return deadline is None or time.monotonic() + delay < deadline
+
+
+def http_call(method: str, url: str, *, params=None, json_body=None, timeout=None, deadline=None):
+    """
+    Send one request through the pooled session, retrying transient failures.
+    deadline: time.monotonic() value; per-attempt timeouts shrink to fit it
+    and no retry is started that could not finish before it.
+    """
+    session = get_http_session()
+    timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    t0 = time.perf_counter()
+    attempt = 0
+    while True:
+        try:
+            r = session.request(method, url, params=params, json=json_body,
+                                timeout=_timeout_within(timeout, deadline))
+        except (requests.ConnectionError, requests.Timeout):
+            delay = _backoff_delay(attempt)
+            if attempt >= MAX_RETRIES or not _fits(delay, deadline):
+                http_stats.record(time.perf_counter() - t0, attempt, failed=True)
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        if r.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+            delay = _backoff_delay(attempt, r)
+            if _fits(delay, deadline):
+                time.sleep(delay)
+                attempt += 1
+                continue
+        http_stats.record(time.perf_counter() - t0, attempt, failed=r.status_code != 200)
+        return r
+
 def parse_latlon(s: str):
     try:
         lat, lon = s.split(",")
@@ -268,6 +475,192 @@ def build_avoid_rectangles(rects_ll):
     return {"avoidAreas": {"rectangles": rectangles}} if rectangles else {}
 
 
+# ---------- Route polyline simplification / encoding ----------
+#
+# Douglas–Peucker in a local metric projection: every dropped point lies
+# within tolerance_m of the kept polyline, so a route checked or drawn
+# simplified is off by at most that much. MAX_SIMPLIFY_TOLERANCE_M stays well
+# inside the 60 m safety pad scale_rect_reasonably puts around every work, so
+# a simplified route that clears the padded boxes still clears the works.
+
+MAX_SIMPLIFY_TOLERANCE_M = 25.0
+
+
+def _seg_dist_m(px, py, ax, ay, bx, by):
+    dx, dy = bx - ax, by - ay
+    L2 = dx * dx + dy * dy
+    t = 0.0 if L2 == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / L2))
+    return math.hypot(px - ax - t * dx, py - ay - t * dy)
+
+
+def simplify_coords(coords, tolerance_m):
+    """coords: list of [lon, lat]; returns the kept subset (first and last always kept)."""
+    n = len(coords)
+    if n < 3 or tolerance_m <= 0:
+        return [list(c) for c in coords]
+    lat0 = sum(c[1] for c in coords) / n
+    kx, ky = meters_per_deg_lon(lat0), meters_per_deg_lat()
+    xs = [c[0] * kx for c in coords]
+    ys = [c[1] * ky for c in coords]
+
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        worst, worst_d = None, tolerance_m
+        for k in range(i + 1, j):
+            d = _seg_dist_m(xs[k], ys[k], xs[i], ys[i], xs[j], ys[j])
+            if d > worst_d:
+                worst, worst_d = k, d
+        if worst is not None:
+            keep[worst] = True
+            stack.append((i, worst))
+            stack.append((worst, j))
+    return [list(c) for c, kept in zip(coords, keep) if kept]
+
+
+def simplify_geometry(geojson_geom, tolerance_m):
+    """Simplified copy of a GeoJSON LineString/MultiLineString."""
+    typ = geojson_geom.get("type")
+    if typ == "LineString":
+        coords = simplify_coords(geojson_geom["coordinates"], tolerance_m)
+    elif typ == "MultiLineString":
+        coords = [simplify_coords(part, tolerance_m) for part in geojson_geom["coordinates"]]
+    else:
+        raise ValueError("Only LineString or MultiLineString are supported.")
+    return {"type": typ, "coordinates": coords}
+
+
+def round_geometry(geojson_geom, precision):
+    """Copy with coordinates rounded to `precision` decimals (5 ≈ 1 m)."""
+    def rnd(part):
+        return [[round(x, precision), round(y, precision)] for x, y in part]
+    coords = geojson_geom["coordinates"]
+    if geojson_geom.get("type") == "MultiLineString":
+        return {"type": "MultiLineString", "coordinates": [rnd(p) for p in coords]}
+    return {"type": geojson_geom["type"], "coordinates": rnd(coords)}
+
+
+def encode_polyline(coords, precision=5):
+    """
+    Google encoded-polyline string for [lon, lat] coords (encoded lat first,
+    as every decoder expects). precision 5 is the usual one, 6 for OSRM-style.
+    """
+    factor = 10 ** precision
+    out, prev_lat, prev_lon = [], 0, 0
+    for lon, lat in coords:
+        ilat, ilon = int(round(lat * factor)), int(round(lon * factor))
+        for delta in (ilat - prev_lat, ilon - prev_lon):
+            v = ~(delta << 1) if delta < 0 else delta << 1
+            while v >= 0x20:
+                out.append(chr((0x20 | (v & 0x1F)) + 63))
+                v >>= 5
+            out.append(chr(v + 63))
+        prev_lat, prev_lon = ilat, ilon
+    return "".join(out)
+
+
+# ---------- Avoid-rectangle coalescing ----------
+#
+# Rectangles collected while solving tend to pile up on top of each other in
+# dense areas. Before they go into avoidAreas, overlapping or near-adjacent
+# boxes are replaced by their common bounding box as long as that box is not
+# much bigger than its parts (area-inflation budget). If more than the
+# provider's limit is left, the cheapest pairs are merged regardless of the
+# per-merge budget, while the total covered area stays within budget; what
+# still does not fit is dropped, oldest first. The solver appends the
+# rectangles the last route ran into, so the newest ones are what the next
+# request must avoid; the older ones were already routed around.
+
+AVOID_DEFAULTS = {
+    "MAX_RECTS": 10,          # TomTom avoidAreas limit
+    "MERGE_GAP_METERS": 30.0,
+    "MAX_INFLATION": 1.5,     # merged box area <= 1.5 x the area of its parts
+}
+
+
+def _avoid_config():
+    from django.conf import settings
+    return {**AVOID_DEFAULTS, **getattr(settings, "AVOID_AREAS", {})}
+
+
+def _area_m2(rect):
+    w, h = _rect_dims_m(rect)
+    return w * h
+
+
+def _union_rect(a, b):
+    return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+
+def coalesce_rects(rect_specs, *, max_count=None, gap_m=None, max_inflation=None):
+    """
+    rect_specs: list of [minLon, minLat, maxLon, maxLat]
+    Returns a smaller list of rectangles covering them (see above). Order
+    follows the first rectangle of every merged group.
+    """
+    cfg = _avoid_config()
+    max_count = cfg["MAX_RECTS"] if max_count is None else max_count
+    gap_m = cfg["MERGE_GAP_METERS"] if gap_m is None else gap_m
+    max_inflation = cfg["MAX_INFLATION"] if max_inflation is None else max_inflation
+
+    # id -> [rect, area of parts, first part, newest part]
+    boxes = {}
+    idx = index.Index()
+    for i, r in enumerate(rect_specs):
+        rect = [float(v) for v in r[:4]]
+        boxes[i] = [rect, _area_m2(rect), i, i]
+        idx.insert(i, tuple(rect))
+    next_id = len(boxes)
+    budget = max_inflation * sum(b[1] for b in boxes.values())
+
+    def merge(i, j):
+        nonlocal next_id
+        a, b = boxes.pop(i), boxes.pop(j)
+        idx.delete(i, tuple(a[0]))
+        idx.delete(j, tuple(b[0]))
+        rect = _union_rect(a[0], b[0])
+        boxes[next_id] = [rect, a[1] + b[1], min(a[2], b[2]), max(a[3], b[3])]
+        idx.insert(next_id, tuple(rect))
+        next_id += 1
+        return next_id - 1
+
+    # 1) overlapping / near-adjacent pairs within the per-merge budget
+    pending = list(boxes)
+    while pending:
+        i = pending.pop()
+        if i not in boxes:
+            continue
+        rect, parts, _, _ = boxes[i]
+        for j in idx.intersection(tuple(_inflate_axis_m(rect, gap_m, gap_m))):
+            if j == i:
+                continue
+            other = boxes[j]
+            if _area_m2(_union_rect(rect, other[0])) <= max_inflation * (parts + other[1]):
+                pending.append(merge(i, j))
+                break
+
+    # 2) still too many: merge the cheapest neighbours while the total fits
+    total = sum(_area_m2(b[0]) for b in boxes.values())
+    while len(boxes) > max_count:
+        best = None
+        for i, (rect, _, _, _) in boxes.items():
+            for j in idx.nearest(tuple(rect), 2):
+                if j == i:
+                    continue
+                grow = _area_m2(_union_rect(rect, boxes[j][0])) - _area_m2(rect) - _area_m2(boxes[j][0])
+                if best is None or grow < best[0]:
+                    best = (grow, i, j)
+        if best is None or total + best[0] > budget:
+            break
+        total += best[0]
+        merge(best[1], best[2])
+
+    kept = sorted(boxes.values(), key=lambda b: b[3], reverse=True)[:max_count]
+    return [b[0] for b in sorted(kept, key=lambda b: b[2])]
+
+
 def request_route(
     api_key: str,
     orig: str,
@@ -275,9 +668,11 @@ def request_route(
     avoid_body: Optional[dict] = None,
     depart: str = "now",
     route_type: str = "fastest",   # classic naming; we’ll map to Orbis
-    traffic: bool = True           # True->"live", False->"historical"
+    traffic: bool = True,          # True->"live", False->"historical"
+    max_alternatives: int = 0,     # extra routes TomTom may return (0-5)
+    deadline: Optional[float] = None,  # time.monotonic() the call must finish by
 ) -> Dict[str, Any]:
-    url = f"{BASE}/{orig}:{dest}/json"
+    url = f"{tomtom_base_url()}/{orig}:{dest}/json"
 
     # map classic -> Orbis
     route_type_map = {
@@ -297,11 +692,13 @@ def request_route(
         "traffic": orbis_traffic,
         "departAt": depart
     }
+    if max_alternatives:
+        params["maxAlternatives"] = max_alternatives
 
     if avoid_body:
-        r = requests.post(url, params=params, json=avoid_body, timeout=30)
+        r = http_call("POST", url, params=params, json_body=avoid_body, deadline=deadline)
     else:
-        r = requests.get(url, params=params, timeout=30)
+        r = http_call("GET", url, params=params, deadline=deadline)
 
     if r.status_code != 200:
         try:
@@ -313,13 +710,25 @@ def request_route(
 
 
 
-def merger(places_to_avoid, orig_str, dest_str):
-    # setting necessary variables
-    os.environ["TOMTOM_API_KEY"] = "d3vvBROnoyU7GqJM0zFiNMsMLM0toZ4w"
-    api_key = os.getenv("TOMTOM_API_KEY")
+MAX_ALTERNATIVES = 3   # alternatives asked for per TomTom call
+
+
+def routing_backend():
+    """"tomtom" (default) or "osm" for the offline road graph."""
+    from django.conf import settings
+    return getattr(settings, "ROUTING_BACKEND", "tomtom")
+
+
+def route_candidates(places_to_avoid, orig_str, dest_str, alternatives=0, depart="now", deadline=None):
+    """
+    One TomTom call; returns [(geometry, geojson), ...] for the main route and
+    up to `alternatives` extra ones, fastest first. depart: "now" or an ISO
+    8601 departure time (traffic is predicted for it). deadline: see http_call.
+    """
+    from django.conf import settings
+    api_key = getattr(settings, "TOMTOM_API_KEY", "")
     if not api_key:
-        # print("ERROR: set TOMTOM_API_KEY environment variable.", file=sys.stderr)
-        raise APIException("environment key error")
+        raise APIException("TOMTOM_API_KEY is not set.")
 
     # TomTom wants lat,lon (NOT lon,lat)
     # orig_str = "23.7767759,90.3996056"   # Dhaka area: lat,lon
@@ -329,93 +738,247 @@ def merger(places_to_avoid, orig_str, dest_str):
     if places_to_avoid:
         # Make sure build_avoid_rectangles builds polygons with [lon,lat] pairs,
         # but the spec array you pass in should be [minLon, minLat, maxLon, maxLat]
-        avoid_body = build_avoid_rectangles(places_to_avoid)
+        avoid_body = build_avoid_rectangles(coalesce_rects(places_to_avoid))
 
     try:
-        if avoid_body:
-            data = request_route(
-                api_key=api_key,
-                orig=orig_str,
-                dest=dest_str,
-                avoid_body=avoid_body,
-                depart="now",
-                route_type="fastest",
-                traffic=True
-            )
-        else:
-            data = request_route(
-                api_key=api_key,
-                orig=orig_str,
-                dest=dest_str,
-                depart="now",
-                route_type="fastest",
-                traffic=True
-            )
-
-        route = data["routes"][0]
-        summary = route["summary"]
+        data = request_route(
+            api_key=api_key,
+            orig=orig_str,
+            dest=dest_str,
+            avoid_body=avoid_body or None,
+            depart=depart,
+            route_type="fastest",
+            traffic=True,
+            max_alternatives=alternatives,
+            deadline=deadline,
+        )
+
+        candidates = []
+        for route in data["routes"]:
+            summary = route["summary"]
+            # Extract polyline points from the first leg
+            points = route["legs"][0]["points"]  # [{'latitude':..,'longitude':..}, ...]
+            gj = to_geojson_from_points(points, props=summary)
+            candidates.append((gj["features"][0]["geometry"], gj))
+        candidates.sort(key=lambda c: c[1]["features"][0]["properties"]["travelTimeInSeconds"])
+
+        summary = candidates[0][1]["features"][0]["properties"]
         km = summary["lengthInMeters"] / 1000.0
         mins = summary["travelTimeInSeconds"] / 60.0
-        print(f"Route ≈ {km:.2f} km, {mins:.1f} min (traffic-aware)")
-
-        # Extract polyline points from the first leg
-        points = route["legs"][0]["points"]  # [{'latitude':..,'longitude':..}, ...]
-        #json file
-        gj = to_geojson_from_points(points, props=summary)
-
-        geometry = gj["features"][0]["geometry"]
-        # with open("route.geojson", "w", encoding="utf-8") as f:
-        #     json.dump(gj, f, ensure_ascii=False, indent=2)
-        # print("Saved route to route.geojson")
-
-        return geometry,gj  # <-- return so caller can use it
+        logger.debug("Route %.2f km, %.1f min (traffic-aware), %d candidate(s)", km, mins, len(candidates))
+        return candidates
     except Exception as e:
         # print(f"Failed: {e}", file=sys.stderr)
         raise APIException("Failed to fetch route from TomTom API.")
 
 
-def routeProbSolver(rect_specs, orig_str, dest_str):
+def merger(places_to_avoid, orig_str, dest_str):
+    """Fastest route only: (geometry, geojson)."""
+    return route_candidates(places_to_avoid, orig_str, dest_str)[0]
+
+
+def corridor_bbox(orig_str, dest_str, *, min_pad_m=2000.0, pad_ratio=0.3):
+    """
+    [minLon, minLat, maxLon, maxLat] around the straight origin->destination
+    segment, padded by max(min_pad_m, pad_ratio * trip length) on every side.
+    Obstacles outside it are very unlikely to matter for the route.
+    """
+    olat, olon = parse_latlon(orig_str)
+    dlat, dlon = parse_latlon(dest_str)
+    rect = normalize_rect(olon, olat, dlon, dlat)
+    w_m, h_m = _rect_dims_m(rect)
+    pad = max(min_pad_m, pad_ratio * math.hypot(w_m, h_m))
+    return _clamp_lat_bounds(_inflate_axis_m(rect, pad, pad))
+
+
+def straight_line_obstacles(idx, rects, orig_str, dest_str):
+    """Ids of every rect the straight origin->destination line runs through."""
+    olat, olon = parse_latlon(orig_str)
+    dlat, dlon = parse_latlon(dest_str)
+    a, b = Point(olon, olat), Point(dlon, dlat)
+    ids = set()
+    for ridx in idx.intersection(segment_bbox(a, b)):
+        t, _ = first_hit_with_rect(a, b, rects[ridx])
+        if t is not None:
+            ids.add(rects[ridx].id)
+    return sorted(ids)
+
+
+MIN_ROUND_SECONDS = 1.0   # no new TomTom round with less budget left once a route is in hand
+
+
+class RouteTimeout(APIException):
+    status_code = 504
+    default_detail = "Routing time budget exhausted before any route was found."
+    default_code = "route_timeout"
+
+
+def _rect_ids(collisions):
+    """Distinct avoid rectangles behind a list of per-segment collision records."""
+    return {h["rect_id"] for h in collisions}
+
+
+def _annotate_collisions(resdata, collisions, rect_specs):
+    """
+    Copy of resdata with the avoid rectangles its route still crosses in the
+    feature properties, one entry per rectangle at its first hit.
+    """
+    feature = resdata["features"][0]
+    remaining, seen = [], set()
+    for h in sorted(collisions, key=lambda h: (h["segment_index"], h["t"])):
+        if h["rect_id"] in seen:
+            continue
+        seen.add(h["rect_id"])
+        remaining.append({
+            "rect": rect_specs[h["rect_id"] - 1], "segment_index": h["segment_index"],
+            "point": [h["hit_point"].x, h["hit_point"].y],
+        })
+    properties = {**feature["properties"], "remainingCollisions": remaining}
+    return {**resdata, "features": [{**feature, "properties": properties}]}
+
+
+def routeProbSolver(
+    rect_specs, orig_str, dest_str, preseed=False, stats=None, avoid_index=None, simplify_m=0.0, depart_at=None,
+    deadline=None,
+):
+    """
+    Ask TomTom for a route, then keep adding the rectangles it runs through
+    to the avoid set until it is clean (max 10 round trips). With
+    ROUTING_BACKEND = "osm" the route comes from the local road graph
+    instead (see road_graph.py), in a single query.
+    rect_specs:  raw work extents, scaled here; ignored when avoid_index
+                 (an already built AvoidIndex, see avoid_index.py) is given.
+    preseed: start with the rectangles on the straight-line corridor already
+             in the avoid set, which usually saves the first few iterations.
+    stats:   optional dict, filled with "iterations" (TomTom calls made),
+             "cached", "collisions" (avoid rectangles the returned route
+             still crosses) and "timed_out" (deadline hit before the route
+             was clean).
+    simplify_m: collision-test routes simplified to this tolerance (meters,
+             capped at MAX_SIMPLIFY_TOLERANCE_M); the returned route is not
+             simplified.
+    depart_at: aware datetime of a future departure (default: now); the
+             caller is expected to have filtered the avoid set to it.
+    deadline: time.monotonic() by which to answer. TomTom timeouts shrink to
+             fit it, and once it is (nearly) spent the route crossing the
+             fewest rectangles so far is returned. That route is not cached.
+             RouteTimeout when it runs out before any route came back.
+    Whenever the returned route still collides, the rectangles it crosses
+    are listed in its "remainingCollisions" property.
+    """
     # rectangle spec must be [minLon, minLat, maxLon, maxLat]
     resdata = None
-    # rect_specs = [
-    #     [1,1,1,1],
-    #     [90.399345,23.791977, 90.401485,23.793821],
-    #     #[ 90.406921, 23.791024, 90.410397 ,23.789537]
-    #     #[90.401165, 23.800938, 90.402385, 23.801392]
-        
-    # ]
-   # rect_specs = [[90.4010, 23.8007, 90.4035, 23.8023]]
-    if(len(rect_specs)<1):rect_specs.append([1,1,1,1])
-    
-    for i in range(len(rect_specs)):
-        scaled = scale_rect_reasonably(rect_specs[i], min_w_m=120, min_h_m=120, safety_pad_m=60)
-        rect_specs[i] = scaled
-    print(rect_specs)
-    idx, rects = build_rect_index_from_array_of_arrays(rect_specs)
+    stats = stats if stats is not None else {}
+    stats.update(iterations=0, cached=False, collisions=0, timed_out=False)
+    if avoid_index is None:
+        avoid_index = AvoidIndex.from_extents(rect_specs)
+    rect_specs, idx, rects = avoid_index.specs, avoid_index.idx, avoid_index.rects
+    simplify_m = min(float(simplify_m or 0.0), MAX_SIMPLIFY_TOLERANCE_M)
+
+    def collisions_of(geometry):
+        if simplify_m > 0:
+            geometry = simplify_geometry(geometry, simplify_m)
+        return avoid_index.collisions(geometry)
+
+    # same trip, same obstacles, same traffic bucket, same check tolerance
+    # -> reuse the solved route
+    cache_key = route_cache.make_key(
+        orig_str, dest_str, rect_specs, avoid_hash=avoid_index.digest,
+        now=depart_at.timestamp() if depart_at else None, simplify_m=simplify_m,
+    )
+    # cached as (route, rectangles it still crosses)
+    cached = route_cache.get(cache_key)
+    if cached is not None:
+        stats["cached"] = True
+        resdata, stats["collisions"] = cached
+        return resdata
+
+    if routing_backend() == "osm":
+        # local road graph: all rectangles masked up front, one A* query
+        from .road_graph import offline_route
+        stats["iterations"] = 1
+        _, resdata, collisions = offline_route(avoid_index, orig_str, dest_str)
+        stats["collisions"] = len(_rect_ids(collisions))
+        if collisions:
+            resdata = _annotate_collisions(resdata, collisions, rect_specs)
+        route_cache.set(cache_key, (resdata, stats["collisions"]))
+        return resdata
 
     places_to_avoid = None
+    if preseed:
+        seeded = straight_line_obstacles(idx, rects, orig_str, dest_str)
+        if seeded:
+            places_to_avoid = [rect_specs[rid - 1] for rid in seeded]
+    def out_of_time():
+        return deadline is not None and deadline - time.monotonic() < MIN_ROUND_SECONDS
+
+    best = None   # (rectangles crossed, resdata, collisions), fewest first seen
+    to_send = coalesce_rects(places_to_avoid) if places_to_avoid else None
     iteration_left = 10
     while iteration_left>0:
+        if best is None and deadline is not None and deadline <= time.monotonic():
+            # e.g. a batch pair that only got its turn after the deadline
+            raise RouteTimeout()
+        if best is not None and out_of_time():
+            stats["timed_out"] = True
+            break
         iteration_left-=1
-        path_geometry,resdata = merger(places_to_avoid, orig_str, dest_str)   # now returns geometry
-        #print(path_geometry)
-        # break  # remove this if you want to iterate until no collisions
-        #break;
-        collisions = path_or_multiline_collisions(idx, rects, path_geometry)
+        stats["iterations"] += 1
+        sent = to_send   # coalesced avoid set of this TomTom call
+        try:
+            candidates = route_candidates(
+                places_to_avoid, orig_str, dest_str, alternatives=MAX_ALTERNATIVES,
+                depart=depart_at.isoformat(timespec="seconds") if depart_at else "now",
+                deadline=deadline,
+            )
+        except APIException:
+            if not out_of_time():
+                raise
+            if best is None:
+                raise RouteTimeout()
+            # the call ran into the deadline; settle for what we have
+            stats["timed_out"] = True
+            break
+        # take the fastest alternative that is already clean; otherwise grow
+        # the avoid set from the fastest one
+        path_geometry, resdata = candidates[0]
+        collisions = collisions_of(path_geometry)
+        for geometry, gj in candidates[1:]:
+            if not collisions:
+                break
+            if not collisions_of(geometry):
+                path_geometry, resdata, collisions = geometry, gj, []
+        crossed = len(_rect_ids(collisions))
+        if best is None or crossed < best[0]:
+            best = (crossed, resdata, collisions)
         if not collisions:
-            print("✅ Path does NOT collide with any avoid-rectangle.")
+            logger.debug("Path does not collide with any avoid-rectangle")
             break
         else:
-            print(f"⚠️  Path collides with {len(collisions)} rectangle(s):")
+            added = False
+            logger.debug("Path collides with %d rectangle(s)", crossed)
             for h in collisions:
-                print(f"  - Rect ID {h['rect_id']} at segment {h['segment_index']} "
-                      f"near {h['hit_point']} (t={h['t']:.3f})")
+                logger.debug("  rect %s at segment %s near %s (t=%.3f)",
+                             h["rect_id"], h["segment_index"], h["hit_point"], h["t"])
                 if places_to_avoid is None:
                     places_to_avoid = []
-                places_to_avoid.append(rect_specs[h['rect_id'] - 1])
-
-        if places_to_avoid and len(places_to_avoid) > 10:
+                spec = rect_specs[h['rect_id'] - 1]
+                if spec not in places_to_avoid:
+                    places_to_avoid.append(spec)
+                    added = True
+
+        # the avoid set is coalesced down to the provider limit, so it can
+        # keep growing; stop once a round adds nothing new, or nothing that
+        # changes what TomTom would be sent
+        if not added:
+            break
+        to_send = coalesce_rects(places_to_avoid)
+        if to_send == sent:
             break
 
-
+    stats["collisions"], resdata, collisions = best
+    if collisions:
+        resdata = _annotate_collisions(resdata, collisions, rect_specs)
+    if not stats["timed_out"]:
+        route_cache.set(cache_key, (resdata, stats["collisions"]))
     return resdata
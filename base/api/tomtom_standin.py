@@ -0,0 +1,228 @@
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from .shortest_path_utils import (
+    CONNECT_TIMEOUT,
+    READ_TIMEOUT,
+    Point,
+    Rectangle,
+    first_hit_with_rect,
+    meters_per_deg_lat,
+    meters_per_deg_lon,
+)
+
+# ---------- Local TomTom calculateRoute stand-in ----------
+#
+# Speaks just enough of the Orbis calculateRoute API for request_route():
+#   GET/POST .../calculateRoute/{lat,lon}:{lat,lon}/json[?maxAlternatives=n]
+#   POST body {"avoidAreas": {"rectangles": [{southWestCorner, northEastCorner}]}}
+#
+# A request is answered from a recorded response when one exists
+# (<replay_dir>/<replay_key>.json). In record mode (record_url set, usually
+# the real calculateRoute endpoint) a miss is forwarded there with the
+# caller's query string, API key included, and a 200 answer is saved under
+# its replay key, so running a workload once through the stand-in records
+# it. Otherwise a miss is answered with synthetic routes: a
+# straight line and a few dog-leg detours through waypoints around the
+# trip, densified to roughly TomTom's point spacing. Routes that cross no
+# avoid rectangle come first (fastest first), so avoidAreas is honoured
+# whenever one of the candidates gets around them. Latency and 503 errors
+# can be injected to exercise timeouts and retries.
+
+SPEED_MS = 25 / 3.6        # synthetic travel speed
+POINT_SPACING_M = 40.0
+PATH_RE = re.compile(r"/(-?[\d.]+),(-?[\d.]+):(-?[\d.]+),(-?[\d.]+)/json$")
+
+
+def replay_key(orig: str, dest: str, avoid_body: Optional[dict], max_alternatives: int = 0, depart: str = "now") -> str:
+    """File name (without .json) a recorded response for this request is looked up under."""
+    rects = (avoid_body or {}).get("avoidAreas", {}).get("rectangles", [])
+    canon = sorted(
+        (round(r["southWestCorner"]["longitude"], 6), round(r["southWestCorner"]["latitude"], 6),
+         round(r["northEastCorner"]["longitude"], 6), round(r["northEastCorner"]["latitude"], 6))
+        for r in rects
+    )
+    return hashlib.sha1(json.dumps([orig, dest, canon, int(max_alternatives), depart]).encode()).hexdigest()
+
+
+def _length_m(coords):
+    total = 0.0
+    for (x0, y0), (x1, y1) in zip(coords, coords[1:]):
+        lat = (y0 + y1) / 2
+        total += math.hypot((x1 - x0) * meters_per_deg_lon(lat), (y1 - y0) * meters_per_deg_lat())
+    return total
+
+
+def _densify(coords):
+    out = [coords[0]]
+    for (x0, y0), (x1, y1) in zip(coords, coords[1:]):
+        steps = max(1, int(_length_m([(x0, y0), (x1, y1)]) // POINT_SPACING_M))
+        for k in range(1, steps + 1):
+            out.append((x0 + (x1 - x0) * k / steps, y0 + (y1 - y0) * k / steps))
+    return out
+
+
+def _crosses(coords, rects):
+    for a, b in zip(coords, coords[1:]):
+        pa, pb = Point(*a), Point(*b)
+        for r in rects:
+            if first_hit_with_rect(pa, pb, r)[0] is not None:
+                return True
+    return False
+
+
+def synthetic_routes(orig, dest, rects: List[Rectangle], count: int) -> List[Dict]:
+    """Up to `count` TomTom-shaped route dicts from orig to dest ((lon, lat) tuples)."""
+    (ox, oy), (dx, dy) = orig, dest
+    # perpendicular offsets of growing size at the midpoint, both sides
+    mx, my = (ox + dx) / 2, (oy + dy) / 2
+    nx, ny = -(dy - oy), dx - ox
+    shapes = [[orig, dest], [orig, (ox, dy), dest], [orig, (dx, oy), dest]]
+    for k in (0.15, 0.3, 0.5, 0.8, 1.2):
+        shapes.append([orig, (mx + k * nx, my + k * ny), dest])
+        shapes.append([orig, (mx - k * nx, my - k * ny), dest])
+
+    scored = []
+    for shape in shapes:
+        coords = _densify(shape)
+        length = _length_m(coords)
+        scored.append((_crosses(coords, rects), length, coords))
+    scored.sort(key=lambda s: (s[0], s[1]))
+
+    routes = []
+    for _, length, coords in scored[:count]:
+        summary = {
+            "lengthInMeters": int(length),
+            "travelTimeInSeconds": int(length / SPEED_MS),
+            "trafficDelayInSeconds": 0,
+        }
+        routes.append({
+            "summary": summary,
+            "legs": [{"summary": summary, "points": [{"latitude": y, "longitude": x} for x, y in coords]}],
+        })
+    return routes
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, *, replay_dir=None, record_url=None, latency_ms=0.0, jitter_ms=0.0,
+                 error_rate=0.0, seed=None):
+        super().__init__(address, StandinHandler)
+        if record_url and not replay_dir:
+            raise ValueError("record_url needs a replay_dir to record into")
+        self.replay_dir = replay_dir
+        self.record_url = record_url.rstrip("/") if record_url else None
+        self.latency_ms, self.jitter_ms, self.error_rate = latency_ms, jitter_ms, error_rate
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.requests = 0
+        self.replayed = 0
+        self.recorded = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/maps/orbis/routing/calculateRoute"
+
+    def start_in_thread(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._route(None)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            body = json.loads(raw) if raw else None
+        except ValueError:
+            return self._send(400, {"detailedError": {"message": "Invalid JSON body"}})
+        self._route(body)
+
+    def _route(self, avoid_body):
+        server = self.server
+        with server.rng_lock:
+            server.requests += 1
+            delay = max(0.0, server.latency_ms + server.rng.uniform(-server.jitter_ms, server.jitter_ms)) / 1000.0
+            fail = server.rng.random() < server.error_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            return self._send(503, {"detailedError": {"message": "Injected failure"}})
+
+        url = urlparse(self.path)
+        m = PATH_RE.search(url.path)
+        if not m:
+            return self._send(400, {"detailedError": {"message": f"Unsupported path {url.path}"}})
+        olat, olon, dlat, dlon = (float(v) for v in m.groups())
+        orig_s, dest_s = f"{m.group(1)},{m.group(2)}", f"{m.group(3)},{m.group(4)}"
+        query = parse_qs(url.query)
+        alternatives = int(query.get("maxAlternatives", ["0"])[0])
+
+        if server.replay_dir:
+            key = replay_key(orig_s, dest_s, avoid_body, alternatives, query.get("departAt", ["now"])[0])
+            recorded = os.path.join(server.replay_dir, key + ".json")
+            if os.path.exists(recorded):
+                with open(recorded, "rb") as f:
+                    payload = f.read()
+                with server.rng_lock:
+                    server.replayed += 1
+                return self._send_raw(200, payload)
+            if server.record_url:
+                return self._record(f"{server.record_url}/{orig_s}:{dest_s}/json", url.query, avoid_body, recorded)
+
+        rects = [
+            Rectangle(r["southWestCorner"]["longitude"], r["southWestCorner"]["latitude"],
+                      r["northEastCorner"]["longitude"], r["northEastCorner"]["latitude"], i)
+            for i, r in enumerate((avoid_body or {}).get("avoidAreas", {}).get("rectangles", []))
+        ]
+        routes = synthetic_routes((olon, olat), (dlon, dlat), rects, 1 + max(0, min(alternatives, 5)))
+        self._send(200, {"formatVersion": "0.0.12", "routes": routes})
+
+    def _record(self, upstream, query, avoid_body, path):
+        """Forward to the real API; a 200 answer is saved at `path` before it is passed on."""
+        import requests
+
+        try:
+            r = requests.request(
+                "POST" if avoid_body else "GET", f"{upstream}?{query}", json=avoid_body, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            )
+        except requests.RequestException as e:
+            return self._send(502, {"detailedError": {"message": f"Recording upstream failed: {e}"}})
+        if r.status_code == 200:
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(r.content)
+            os.replace(tmp, path)
+            with self.server.rng_lock:
+                self.server.recorded += 1
+        self._send_raw(r.status_code, r.content)
+
+    def _send(self, code, data):
+        self._send_raw(code, json.dumps(data).encode())
+
+    def _send_raw(self, code, payload):
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
@@ -289,13 +289,91 @@ def api_root(request):
         {
             "path": "/api/conflicts/",
             "methods": ["GET"],
-            "description": "Detect and list all works that have spatial conflicts based on their locations",
-            "input_fields": [],
+            "description": "Detect and list all works that conflict in both location (intersecting, or within CONFLICT_BUFFER_METERS as near_conflicts) and schedule window. Use ?format=compact for {groups: [[uuid, ...]], works: {uuid: work}}",
+            "input_fields": [
+                {"field": "format", "type": "string", "choices": ["compact"], "optional": True}
+            ],
             "output_fields": [
                 {"field": "work_uuid", "type": "string"},
                 {"field": "conflicting_works", "type": "list of strings"}
             ]
         },
+        {
+            "path": "/api/conflicts/check/",
+            "methods": ["POST"],
+            "description": "What-if check: test up to 500 candidate geometries/date windows against active works in one request, without creating anything",
+            "input_fields": [
+                {"field": "candidates", "type": "list of {geom: GeoJSON/geometry, start_date: date, end_date: date}"}
+            ],
+            "output_fields": [
+                {"field": "results", "type": "list of {index, conflicts: [{uuid, name, status, kind, distance}]}"}
+            ]
+        },
+        {
+            "path": "/api/conflicts/earliest-window/",
+            "methods": ["POST"],
+            "description": "Earliest start date on or after not_before (default today) at which a work of the given duration on the given geometry conflicts with no active work; blocking_works counts the works busy between not_before and that date",
+            "input_fields": [
+                {"field": "geom", "type": "GeoJSON/geometry"},
+                {"field": "estimated_time", "type": "duration"},
+                {"field": "not_before", "type": "date", "optional": True}
+            ],
+            "output_fields": [
+                {"field": "start_date", "type": "date"},
+                {"field": "end_date", "type": "date"},
+                {"field": "blocking_works", "type": "integer"}
+            ]
+        },
+        {
+            "path": "/api/schedule/",
+            "methods": ["POST"],
+            "description": "Suggest start dates for proposed works so that no two conflicting works overlap (Emergency first, Planned/Ongoing works stay fixed). Read-only",
+            "input_fields": [
+                {"field": "works", "type": "list of uuids", "optional": True}
+            ],
+            "output_fields": [
+                {"field": "schedule", "type": "list of {uuid, start_date, end_date, delay_days, late_days}"},
+                {"field": "unscheduled", "type": "list of uuids"}
+            ]
+        },
+        {
+            "path": "/api/shortrouting/batch/",
+            "methods": ["POST"],
+            "description": "Route many origin/destination pairs around ongoing works in one request. The avoid set is built once and pairs are solved concurrently; each pair gets its own route or error. Takes the same filters and route options as /api/shortrouting/",
+            "input_fields": [
+                {"field": "pairs", "type": "list of {orig_str: 'lat,lon', dest_str: 'lat,lon'}"},
+                {"field": "concurrency", "type": "integer", "optional": True},
+                {"field": "statuses", "type": "list or comma-separated string", "optional": True},
+                {"field": "city", "type": "string", "optional": True},
+                {"field": "depart_at", "type": "datetime", "optional": True},
+                {"field": "time_budget", "type": "float (seconds)", "optional": True}
+            ],
+            "output_fields": [
+                {"field": "results", "type": "list of {index, route, iterations, cached, collisions, timed_out}, {index, timed_out, error} or {index, error}"}
+            ]
+        },
+        {
+            "path": "/api/work-conflicts/",
+            "methods": ["GET"],
+            "description": "List conflict edges (one per pair of works) with overlap metrics. Near edges lie within CONFLICT_BUFFER_METERS without intersecting. Use ?work=uuid or ?kind=Intersect|Near to filter and ?ordering=-overlap_length|-overlap_area|-overlap_days|distance to sort by severity",
+            "input_fields": [
+                {"field": "work", "type": "uuid", "optional": True},
+                {"field": "kind", "type": "string", "choices": ["Intersect", "Near"], "optional": True},
+                {"field": "ordering", "type": "string", "optional": True}
+            ],
+            "output_fields": [
+                {"field": "uuid", "type": "string"},
+                {"field": "work_a", "type": "uuid"},
+                {"field": "work_b", "type": "uuid"},
+                {"field": "kind", "type": "string"},
+                {"field": "distance", "type": "float"},
+                {"field": "overlap_length", "type": "float"},
+                {"field": "overlap_area", "type": "float"},
+                {"field": "overlap_days", "type": "integer"},
+                {"field": "created_at", "type": "datetime"},
+                {"field": "updated_at", "type": "datetime"}
+            ]
+        },
         {
             "path": "/api/feedback/",
             "methods": ["GET", "POST"],
@@ -342,6 +420,7 @@ def api_root(request):
 router = DefaultRouter()
 router.register(r'locations', views.LocationViewSet, basename='location')
 router.register(r'works', views.WorkViewSet, basename='work')
+router.register(r'work-conflicts', views.WorkConflictViewSet, basename='work-conflict')
 router.register(r'users', views.UserViewSet, basename='user')
 router.register(r'notices', views.NoticeViewSet, basename='notice')
 router.register(r'notifications', views.NotificationViewSet, basename='notification')
@@ -353,8 +432,12 @@ urlpatterns = [
     path("auth/register/", views.UserRegisterView.as_view()),
     path("auth/login/", views.LoginView.as_view()),
     path("conflicts/", views.conflict_detection_view, name="conflict-detection"),
+    path("conflicts/check/", views.ConflictCheckAPIView.as_view(), name="conflict-check"),
+    path("conflicts/earliest-window/", views.EarliestWindowAPIView.as_view(), name="conflict-earliest-window"),
+    path("schedule/", views.ScheduleProposalsAPIView.as_view(), name="schedule"),
     path("profile/", views.ProfileView.as_view(), name="profile"),
     path("shortrouting/", views.ShortRoutesAPIView.as_view(), name="shortrouting"),
+    path("shortrouting/batch/", views.ShortRoutesBatchAPIView.as_view(), name="shortrouting-batch"),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path("", include(router.urls)),
 ]
@@ -8,30 +8,59 @@ from base.api.serializers import (
     LoginSerializer,
     LocationSerializer,
     WorkSerializer,
+    WorkConflictSerializer,
+    ConflictCheckSerializer,
+    EarliestWindowSerializer,
     NoticeSerializer,
     NotificationSerializer,
     FeedbackSerializer,
     ReportSerializer,
 )
-from base.models import User, Location, Work, Notice, Notification, Feedback, Report
-from rest_framework.decorators import api_view, permission_classes
+from base.conflicts import busy_intervals, check_candidates, conflict_map, spatial_neighbours
+from base.models import User, Location, Work, ConflictGroup, WorkConflict, Notice, Notification, Feedback, Report
+from rest_framework.decorators import api_view, permission_classes, content_negotiation_class
+from rest_framework.negotiation import DefaultContentNegotiation
 from rest_framework import status, filters
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.exceptions import APIException
+from rest_framework.exceptions import APIException, ValidationError
 from base.api.serializers import UserSerializer
-from django.db.models import Prefetch
+from django.db.models import F
 
 
 
-from typing import List, Tuple
+import argparse
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+import uuid
+from datetime import date, timedelta
+from itertools import groupby
+from operator import attrgetter
 
+from django.conf import settings
 from django.contrib.gis.geos import GEOSGeometry
-from django.db.models import Q
-
-
-from .shortest_path_utils import routeProbSolver
+from django.contrib.gis.db.models.functions import Transform as GeoTransform
+from django.db.models import BinaryField, FloatField, Func, Q
+from django.db.models.functions import Round
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+from .shortest_path_utils import (
+    MAX_SIMPLIFY_TOLERANCE_M,
+    RouteTimeout,
+    corridor_bbox,
+    encode_polyline,
+    http_stats,
+    round_geometry,
+    routeProbSolver,
+    simplify_geometry,
+)
+from .avoid_index import EXACT_BUFFER_M, avoid_index_cache
+from .route_cache import route_cache
+from .scheduling_utils import INF, Job, earliest_fit, solve_schedule, split_neighbours
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
@@ -67,37 +96,229 @@ class WorkViewSet(viewsets.ModelViewSet):
     serializer_class = WorkSerializer
     permission_classes = [IsAuthenticated]
 
+class WorkConflictViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Conflict edges with their overlap metrics. ?work=<uuid> limits to one
+    work's conflicts, ?kind=Intersect|Near to one kind, ?ordering=-overlap_length
+    (or overlap_area, overlap_days, distance) sorts by severity.
+    """
+    serializer_class = WorkConflictSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ["overlap_length", "overlap_area", "overlap_days", "distance", "created_at"]
+    ordering = ["-overlap_area", "-overlap_length"]
+
+    def get_queryset(self):
+        qs = WorkConflict.objects.all()
+        work = self.request.query_params.get("work")
+        if work:
+            try:
+                work = uuid.UUID(work)
+            except ValueError:
+                raise ValidationError({"work": "Must be a valid UUID."})
+            qs = qs.filter(Q(work_a_id=work) | Q(work_b_id=work))
+        kind = self.request.query_params.get("kind")
+        if kind:
+            qs = qs.filter(kind__iexact=kind)
+        return qs
+
+
+class CompactFormatNegotiation(DefaultContentNegotiation):
+    """`?format=compact` picks a response shape, not a renderer: render it as JSON."""
+    def select_renderer(self, request, renderers, format_suffix=None):
+        if request.query_params.get(self.settings.URL_FORMAT_OVERRIDE) == "compact":
+            format_suffix = format_suffix or "json"
+        return super().select_renderer(request, renderers, format_suffix)
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@content_negotiation_class(CompactFormatNegotiation)
 def conflict_detection_view(request):
-    works = Work.objects.prefetch_related(
-        Prefetch('conflicts', queryset=Work.objects.exclude(status__in=['Declined', 'Done']))
-    ).filter(status__iexact='ProposedByStakeholder')
-    
-    visited = set()
-    conflict_groups = []
-
-    for work in works:
-        if work.pk in visited:
-            continue
-        group = set([work])
-        stack = [work]
-        while stack:
-            current = stack.pop()
-            for conflicted in current.conflicts.all():
-                if conflicted.pk not in visited and conflicted not in group:
-                    group.add(conflicted)
-                    stack.append(conflicted)
-        if len(group) > 1:
-            for w in group:
-                visited.add(w.pk)
-            # conflict_groups.append([WorkSerializer(w).data for w in group])
-            conflict_groups.append(WorkSerializer(group, many=True).data)
+    """
+    Groups of conflicting works that hold at least one stakeholder proposal.
+    Runs in a fixed number of queries (works + one edge lookup).
+
+    Default: list of groups, each a list of serialized works.
+    ?format=compact: {"groups": [[uuid, ...], ...], "works": {uuid: work, ...}}
+    """
+    # groups are maintained on write (see base.conflicts), so this is a single
+    # indexed read of every group that holds a stakeholder proposal
+    proposed_groups = ConflictGroup.objects.filter(
+        work__status__iexact='ProposedByStakeholder'
+    ).values('group_id')
+    works = list(
+        Work.objects.filter(conflict_group__group_id__in=proposed_groups)
+        .annotate(group_id=F('conflict_group__group_id'))
+        .order_by('group_id', 'created_at')
+    )
+    context = {"request": request, "conflict_map": conflict_map([w.pk for w in works])}
+    conflict_groups = [
+        WorkSerializer(list(group), many=True, context=context).data
+        for _, group in groupby(works, key=attrgetter('group_id'))
+    ]
+
+    if request.query_params.get('format') == 'compact':
+        return Response(
+            {
+                "groups": [[w["uuid"] for w in group] for group in conflict_groups],
+                "works": {w["uuid"]: w for group in conflict_groups for w in group},
+            },
+            status=status.HTTP_200_OK,
+        )
 
     return Response(conflict_groups, status=status.HTTP_200_OK)
 
 
 
+class ConflictCheckAPIView(APIView):
+    """
+    POST /api/conflicts/check/
+    Body JSON:
+      {
+        "candidates": [
+          {"geom": <GeoJSON geometry or WKT>, "start_date": "2025-01-01", "end_date": "2025-01-20"},
+          ...   # up to 500
+        ]
+      }
+
+    Checks every candidate against the active works in one spatial join and
+    writes nothing. Returns one entry per candidate, in request order:
+      {
+        "results": [{"index": 0, "conflicts": [{"uuid", "name", "status", "kind", "distance"}, ...]}, ...]
+      }
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = ConflictCheckSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        candidates = [
+            (c["geom"], c["start_date"], c["end_date"])
+            for c in serializer.validated_data["candidates"]
+        ]
+        results = check_candidates(candidates)
+        return Response(
+            {"results": [{"index": i, "conflicts": hits} for i, hits in enumerate(results)]},
+            status=status.HTTP_200_OK,
+        )
+
+
+
+class EarliestWindowAPIView(APIView):
+    """
+    POST /api/conflicts/earliest-window/
+    Body JSON:
+      {
+        "geom": <GeoJSON geometry or WKT>,
+        "estimated_time": "10 00:00:00",   # duration, rounded up to whole days
+        "not_before": "2025-01-01"          # optional, defaults to today
+      }
+
+    Returns the earliest start on or after `not_before` for which no
+    conflicting active work overlaps, found by sweeping the sorted schedules
+    of the works that touch the geometry:
+      {"start_date": "...", "end_date": "...", "blocking_works": <int>}
+    start_date is null when an open-ended work blocks the location for good.
+    blocking_works counts the works the sweep had to skip past, i.e. the ones
+    busy between not_before and the returned start.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = EarliestWindowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        not_before = data.get("not_before") or timezone.localdate()
+        duration = math.ceil(data["estimated_time"].total_seconds() / 86400)
+
+        busy = [
+            (lower.toordinal(), upper.toordinal() if upper is not None else INF)
+            for lower, upper in busy_intervals(data["geom"], not_before)
+        ]
+        release = not_before.toordinal()
+        start = earliest_fit(release, duration, busy)
+        until = start if start is not None else INF
+        blocking = sum(1 for lower, upper in busy if lower < until and upper > release)
+
+        return Response(
+            {
+                "start_date": date.fromordinal(start) if start is not None else None,
+                "end_date": date.fromordinal(start + duration - 1) if start is not None else None,
+                "blocking_works": blocking,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+
+class ScheduleProposalsAPIView(APIView):
+    """
+    POST /api/schedule/
+    Body JSON (optional):
+      {
+        "works": ["<uuid>", ...]   # defaults to every ProposedByStakeholder work;
+                                   # works listed here that are not proposals are ignored
+      }
+
+    Returns start dates, not before today, so that no two conflicting works
+    overlap; works that are already Planned/Ongoing are treated as fixed.
+    Emergency works go first. Nothing is written.
+      {
+        "schedule": [{"uuid", "start_date", "end_date", "delay_days", "late_days"}, ...],
+        "unscheduled": ["<uuid>", ...]   # blocked by an open-ended conflicting work
+      }
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        qs = Work.objects.filter(status__iexact="ProposedByStakeholder")
+        ids = request.data.get("works")
+        if ids:
+            try:
+                ids = [uuid.UUID(str(i)) for i in ids]
+            except (TypeError, ValueError):
+                return Response({"error": "works must be a list of uuids"}, status=status.HTTP_400_BAD_REQUEST)
+            # only proposals are rescheduled, everything else stays fixed
+            qs = Work.objects.filter(pk__in=ids, status__in=("ProposedByAdmin", "ProposedByStakeholder"))
+
+        today = timezone.localdate()
+        rows = list(qs.values("uuid", "tag", "estimated_time", "proposed_start_date", "proposed_end_date"))
+        jobs = [
+            Job(
+                row["uuid"],
+                duration=math.ceil(row["estimated_time"].total_seconds() / 86400),
+                release=max(row["proposed_start_date"], today).toordinal(),
+                due=row["proposed_end_date"].toordinal(),
+                emergency=row["tag"] == "Emergency",
+            )
+            for row in rows
+        ]
+        job_ids = {j.id for j in jobs}
+
+        # adjacency is spatial only: windows move, so the solver decides
+        # which neighbours end up overlapping in time
+        edges, fixed = split_neighbours(job_ids, spatial_neighbours(job_ids, today))
+
+        solve_schedule(jobs, edges, fixed)
+
+        schedule, unscheduled = [], []
+        for j in sorted(jobs, key=lambda j: (j.start is None, j.start or 0)):
+            if j.start is None:
+                unscheduled.append(str(j.id))
+                continue
+            schedule.append({
+                "uuid": str(j.id),
+                "start_date": date.fromordinal(j.start),
+                "end_date": date.fromordinal(j.end - 1),
+                "delay_days": j.start - j.release,
+                "late_days": max(0, j.end - 1 - j.due),
+            })
+
+        return Response({"schedule": schedule, "unscheduled": unscheduled}, status=status.HTTP_200_OK)
+
+
+
 class NoticeViewSet(viewsets.ModelViewSet):
     queryset = Notice.objects.all()
     serializer_class = NoticeSerializer
@@ -131,29 +352,102 @@ class ProfileView(APIView):
 
 
 
-class ShortRoutesAPIView(APIView):
-    """
-    POST /api/work-rects/
-    Body JSON:
-      {
-        "statuses": ["Ongoing", "Planned"] or "Ongoing,Planned",
-        "city": "Dhaka",
-        "distinct": true,
-        "orig_str": "23.7767759,90.3996056",
-        "dest_str": "23.8104016,90.4125185"
-      }
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.lower() not in ("0", "false", "no")
+    return bool(value)
+
+
+def _shape_route(resdata, simplify_m, output, precision):
+    """Response copy of a solved route FeatureCollection; the cached one is never modified."""
+    feature = resdata["features"][0]
+    geometry = feature["geometry"]
+    if simplify_m > 0:
+        geometry = simplify_geometry(geometry, simplify_m)
+    if output == "polyline":
+        coords = geometry["coordinates"]
+        encoded = (encode_polyline(coords, precision) if geometry["type"] == "LineString"
+                   else [encode_polyline(part, precision) for part in coords])
+        return {"polyline": encoded, "precision": precision, "properties": feature["properties"]}
+    if precision is not None:
+        geometry = round_geometry(geometry, precision)
+    return {**resdata, "features": [{**feature, "geometry": geometry}]}
+
+
+class RouteRequestError(Exception):
+    """Bad routing input; the message goes back to the client as {"error": ...}."""
 
-    Returns JSON:
-      {
-        "route": {...}   # GeoJSON geometry + summary
-      }
-    """
-    def post(self, request):
-        # Base queryset: works with location
-        qs = Work.objects.select_related("location").filter(location__isnull=False)
 
-        # --- Optional filters ---
-        statuses = request.data.get("statuses")
+class RoutingMixin:
+    """Request parsing and solving shared by the single and batch routing views."""
+
+    @staticmethod
+    def corridor_for(orig_str, dest_str):
+        if not orig_str or not dest_str:
+            raise RouteRequestError("orig_str and dest_str are required, format 'lat,lon'")
+        try:
+            return corridor_bbox(orig_str, dest_str)
+        except (argparse.ArgumentTypeError, AssertionError, ValueError):
+            raise RouteRequestError("orig_str and dest_str must be valid 'lat,lon' coordinates")
+
+    @staticmethod
+    def route_options(data):
+        """Options that apply to every route of a request."""
+        output = data.get("output", "geojson")
+        if output not in ("geojson", "polyline"):
+            raise RouteRequestError("output must be 'geojson' or 'polyline'")
+        try:
+            simplify_m = float(data.get("simplify") or 0)
+            precision = data.get("precision")
+            precision = int(precision) if precision is not None else (5 if output == "polyline" else None)
+        except (TypeError, ValueError):
+            raise RouteRequestError("simplify and precision must be numbers")
+        if not 0 <= simplify_m <= MAX_SIMPLIFY_TOLERANCE_M:
+            raise RouteRequestError(f"simplify must be between 0 and {MAX_SIMPLIFY_TOLERANCE_M:g} meters")
+        if precision is not None and not 0 <= precision <= 8:
+            raise RouteRequestError("precision must be between 0 and 8")
+
+        depart_at = data.get("depart_at")
+        if depart_at:
+            try:
+                depart_at = parse_datetime(str(depart_at))
+            except ValueError:
+                depart_at = None
+            if depart_at is None:
+                raise RouteRequestError("depart_at must be an ISO 8601 datetime")
+            if timezone.is_naive(depart_at):
+                depart_at = timezone.make_aware(depart_at)
+            if depart_at < timezone.now() - timedelta(minutes=1):
+                raise RouteRequestError("depart_at must not be in the past")
+
+        max_budget = settings.ROUTE_TIME_BUDGET_SECONDS
+        time_budget = data.get("time_budget")
+        try:
+            time_budget = float(time_budget) if time_budget is not None else max_budget
+        except (TypeError, ValueError):
+            raise RouteRequestError("time_budget must be a number of seconds")
+        if not 0 < time_budget <= max_budget:
+            raise RouteRequestError(f"time_budget must be between 0 and {max_budget:g} seconds")
+        return {
+            "output": output,
+            "simplify_m": simplify_m,
+            "precision": precision,
+            "corridor": _as_bool(data.get("corridor", True)),
+            "preseed": _as_bool(data.get("preseed", False)),
+            "depart_at": depart_at or None,
+            # one budget per request, shared by every route it solves
+            "deadline": time.monotonic() + time_budget,
+        }
+
+    @staticmethod
+    def avoid_index_for(data, on_date=None):
+        """
+        Avoid rectangles of the works matching the request filters (cached,
+        see avoid_index.py). on_date: only works whose schedule covers that day.
+        With "exact": true the real shapes are loaded too, buffered in PostGIS.
+        """
+        statuses = data.get("statuses")
+        status_list = []
         if statuses:
             if isinstance(statuses, str):
                 status_list = [s.strip() for s in statuses.split(",") if s.strip()]
@@ -161,64 +455,209 @@ class ShortRoutesAPIView(APIView):
                 status_list = [str(s).strip() for s in statuses if s]
             else:
                 status_list = ["Ongoing", "Planned"]
-            if status_list:
-                qs = qs.filter(status__in=status_list)
-
-        city = request.data.get("city")
-        if city:
-            qs = qs.filter(location__city__iexact=city)
 
-        dedup = request.data.get("distinct", True)
-        if isinstance(dedup, str):
-            dedup = dedup.lower() not in ("0", "false", "no")
+        city = data.get("city")
+        dedup = _as_bool(data.get("distinct", True))
+        exact = _as_bool(data.get("exact", False))
 
-        rect_specs: List[List[float]] = []
-        seen: set = set()
-
-        for work in qs:
-            loc = getattr(work, "location", None)
-            if not loc:
-                continue
-            geom = getattr(loc, "geom", None)
-            if geom is None:
-                continue
+        def load_rect_specs():
+            # One row of rounded 4326 extent bounds per work, computed in
+            # PostGIS; no model or GEOS objects are built on this side.
+            qs = Work.objects.filter(location__isnull=False, location__geom__isnull=False)
+            if status_list:
+                qs = qs.filter(status__in=status_list)
+            if city:
+                qs = qs.filter(location__city__iexact=city)
+            if on_date is not None:
+                # @> on the GiST-indexed schedule range
+                qs = qs.filter(schedule__contains=on_date)
+
+            geom_4326 = GeoTransform("location__geom", 4326)
+            bounds = {
+                name: Round(Func(geom_4326, function=fn, output_field=FloatField()), 8)
+                for name, fn in (("xmin", "ST_XMin"), ("ymin", "ST_YMin"), ("xmax", "ST_XMax"), ("ymax", "ST_YMax"))
+            }
+            if not exact:
+                rows = qs.annotate(**bounds).values_list("xmin", "ymin", "xmax", "ymax")
+                if dedup:
+                    rows = rows.distinct()
+                return [[float(v) for v in row] for row in rows.iterator(chunk_size=2000)], None
+
+            # one row per location with its shape buffered in meters; works
+            # sharing a location collapse when deduplicating
+            shape = Func(
+                geom_4326,
+                template=f"ST_AsBinary(ST_Buffer((%(expressions)s)::geography, {float(EXACT_BUFFER_M)})::geometry)",
+                output_field=BinaryField(),
+            )
+            rows = qs.annotate(**bounds, shape=shape).values_list("location_id", "xmin", "ymin", "xmax", "ymax", "shape")
+            if dedup:
+                rows = rows.distinct()
+            specs, shapes = [], []
+            for _, xmin, ymin, xmax, ymax, wkb in rows.iterator(chunk_size=500):
+                specs.append([float(xmin), float(ymin), float(xmax), float(ymax)])
+                shapes.append(bytes(wkb))
+            return specs, shapes
+
+        # built once per filter and worker, until a Work/Location write
+        cache_key = ((city or "").lower(), tuple(sorted(status_list)), dedup, on_date, exact)
+        return avoid_index_cache.get_or_build(cache_key, load_rect_specs)
+
+    @staticmethod
+    def depart_date(options):
+        return timezone.localdate(options["depart_at"]) if options["depart_at"] else None
+
+    @staticmethod
+    def solve(avoid_index, orig_str, dest_str, bbox, options):
+        # Only works whose extent touches the padded trip corridor
+        if options["corridor"]:
+            avoid_index = avoid_index.within(bbox)
+        solve_stats = {}
+        resdata = routeProbSolver(
+            rect_specs=None, orig_str=orig_str, dest_str=dest_str,
+            preseed=options["preseed"], stats=solve_stats,
+            avoid_index=avoid_index, simplify_m=options["simplify_m"], depart_at=options["depart_at"],
+            deadline=options["deadline"],
+        )
+        return {
+            "route": _shape_route(resdata, options["simplify_m"], options["output"], options["precision"]),
+            "iterations": solve_stats["iterations"],
+            "cached": solve_stats["cached"],
+            "collisions": solve_stats["collisions"],
+            "timed_out": solve_stats["timed_out"],
+        }
+
+
+class ShortRoutesAPIView(RoutingMixin, APIView):
+    """
+    POST /api/shortrouting/
+    Body JSON:
+      {
+        "statuses": ["Ongoing", "Planned"] or "Ongoing,Planned",
+        "city": "Dhaka",
+        "distinct": true,
+        "orig_str": "23.7767759,90.3996056",
+        "dest_str": "23.8104016,90.4125185",
+        "corridor": true,    # only avoid works near the origin->destination corridor
+        "preseed": false,    # start with the works on the straight line already avoided
+        "simplify": 0,       # meters (max 25): simplify the route for collision checks and the response
+        "output": "geojson", # or "polyline" (Google encoded polyline)
+        "precision": 5,      # coordinate decimals; default 5 for polyline, full for geojson
+        "depart_at": "2025-03-01T08:30:00+06:00",  # optional, see below
+        "exact": false,      # test routes against the real (buffered) work shapes, not their boxes
+        "time_budget": 20    # seconds (max ROUTE_TIME_BUDGET_SECONDS), see below
+      }
 
-            # Convert to 4326 safely
-            try:
-                geom_4326 = geom if geom.srid == 4326 else geom.clone().transform(4326)
-            except Exception:
-                geom_4326 = geom
+    With depart_at, only works whose schedule covers the departure day are
+    avoided and TomTom predicts traffic for that time instead of now.
 
-            try:
-                xmin, ymin, xmax, ymax = geom_4326.extent
-            except Exception:
-                continue
+    TomTom round trips stop once time_budget is (nearly) spent; the route
+    crossing the fewest avoid rectangles so far is returned with
+    "timed_out": true (504 if no route came back at all).
 
-            rect = [round(float(xmin), 8), round(float(ymin), 8),
-                    round(float(xmax), 8), round(float(ymax), 8)]
-            tup = tuple(rect)
+    Returns JSON:
+      {
+        "route": {...},      # GeoJSON geometry + summary
+        "iterations": 1,     # TomTom round trips spent on this request
+        "cached": false,
+        "collisions": 0,     # avoid rectangles the route still crosses, listed
+                             # in its "remainingCollisions" property when > 0
+        "timed_out": false
+      }
 
-            if dedup and tup in seen:
-                continue
-            seen.add(tup)
+    GET (authenticated) returns the route cache, avoid-index cache and TomTom
+    client counters.
+    """
+    def get_permissions(self):
+        if self.request.method == "GET":
+            return [IsAuthenticated()]
+        return super().get_permissions()
 
-            rect_specs.append(rect)
+    def get(self, request):
+        return Response(
+            {"cache": route_cache.stats(), "avoid_index": avoid_index_cache.stats(), "http": http_stats.snapshot()},
+            status=status.HTTP_200_OK,
+        )
 
-        # --- Validate start/end ---
+    def post(self, request):
         orig_str = request.data.get("orig_str")
         dest_str = request.data.get("dest_str")
-        if not orig_str or not dest_str:
-            return Response(
-                {"error": "orig_str and dest_str are required, format 'lat,lon'"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        try:
+            bbox = self.corridor_for(orig_str, dest_str)
+            options = self.route_options(request.data)
+        except RouteRequestError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        avoid_index = self.avoid_index_for(request.data, self.depart_date(options))
         try:
-            resdata = routeProbSolver(rect_specs=rect_specs, orig_str=orig_str, dest_str=dest_str)
+            result = self.solve(avoid_index, orig_str, dest_str, bbox, options)
+        except RouteTimeout:
+            raise
         except Exception as e:
             raise APIException(f"Routing failed: {e}")
 
-        return Response(
-            {"route": resdata},
-            status=status.HTTP_200_OK
-        )
\ No newline at end of file
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class ShortRoutesBatchAPIView(RoutingMixin, APIView):
+    """
+    POST /api/shortrouting/batch/
+    Body JSON: the filters and route options of /api/shortrouting/, plus
+      {
+        "pairs": [
+          {"orig_str": "23.7767759,90.3996056", "dest_str": "23.8104016,90.4125185"},
+          ...
+        ],                   # at most ROUTE_BATCH_MAX_PAIRS
+        "concurrency": 4     # pairs solved at once against TomTom (max ROUTE_BATCH_MAX_CONCURRENCY)
+      }
+
+    The avoid index is built (or taken from cache) once for the whole batch,
+    and time_budget covers the whole batch too: pairs that get no route
+    before it runs out come back as {"index", "timed_out": true, "error"}.
+
+    Returns JSON, one entry per pair in request order:
+      {
+        "results": [
+          {"index": 0, "route": {...}, "iterations": 1, "cached": false, "collisions": 0, "timed_out": false},
+          {"index": 1, "error": "..."},
+          {"index": 2, "timed_out": true, "error": "..."}
+        ]
+      }
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        pairs = request.data.get("pairs")
+        max_pairs = settings.ROUTE_BATCH_MAX_PAIRS
+        if not isinstance(pairs, list) or not pairs:
+            return Response({"error": "pairs must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(pairs) > max_pairs:
+            return Response({"error": f"at most {max_pairs} pairs per batch"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            concurrency = int(request.data.get("concurrency") or settings.ROUTE_BATCH_CONCURRENCY)
+            options = self.route_options(request.data)
+        except (TypeError, ValueError):
+            return Response({"error": "concurrency must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        except RouteRequestError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        concurrency = max(1, min(concurrency, settings.ROUTE_BATCH_MAX_CONCURRENCY, len(pairs)))
+
+        avoid_index = self.avoid_index_for(request.data, self.depart_date(options))
+
+        def run(i, pair):
+            try:
+                if not isinstance(pair, dict):
+                    raise RouteRequestError("each pair must be an object with orig_str and dest_str")
+                orig_str, dest_str = pair.get("orig_str"), pair.get("dest_str")
+                bbox = self.corridor_for(orig_str, dest_str)
+                return {"index": i, **self.solve(avoid_index, orig_str, dest_str, bbox, options)}
+            except RouteTimeout as e:
+                return {"index": i, "timed_out": True, "error": str(e.detail)}
+            except Exception as e:
+                return {"index": i, "error": str(e)}
+
+        # the solver only does HTTP and in-memory work, no DB access from the threads
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(run, range(len(pairs)), pairs))
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
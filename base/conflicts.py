@@ -0,0 +1,422 @@
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+
+# ---------- Conflict maintenance for Work ----------
+#
+# A Work conflicts with every other *active* Work whose location geometry
+# intersects its own, or comes within CONFLICT_BUFFER_METERS of it (a "Near"
+# conflict), and whose schedule window overlaps its own. Edges live
+# in WorkConflict, one row per unordered pair (work_a < work_b) carrying the
+# overlap metrics. Instead of rewriting a work's whole edge set, we apply the
+# add/remove delta for a single work in one statement and only when
+# something that affects the predicate actually changed.
+#
+# Connected components of that graph are persisted as ConflictGroup rows
+# (one group id per work that has at least one conflict). Added edges merge
+# groups, removed edges re-split only the group they belonged to.
+#
+# An edge delta and its group patch commit together. Edge and group writes
+# are serialized by a transaction-scoped advisory lock, taken before any
+# edge row is touched (so it always comes first and cannot deadlock with
+# the row locks). A merge can pull any number of groups together, so the
+# lock is one for all groups. Each patch then reads the edges of every
+# patch committed before it.
+
+GROUPS_LOCK_KEY = 0x57434752   # pg_advisory_xact_lock key for conflict group writes
+
+
+def lock_conflict_groups():
+    """Hold the conflict-group lock until the surrounding transaction ends."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [GROUPS_LOCK_KEY])
+
+
+# Kind and overlap metrics of a pair, given their geometries and schedules.
+# Expects a `CROSS JOIN LATERAL (SELECT ST_Intersection(...) AS inter) ov` in
+# scope, so the intersection is computed once per pair.
+OVERLAP_METRICS_SQL = """
+    CASE WHEN ST_IsEmpty(ov.inter) THEN 'Near' ELSE 'Intersect' END,
+    CASE WHEN ST_IsEmpty(ov.inter) THEN ST_Distance({geom_a}::geography, {geom_b}::geography) ELSE 0 END,
+    COALESCE(ST_Length(ST_CollectionExtract(ov.inter, 2)::geography), 0),
+    COALESCE(ST_Area(ST_CollectionExtract(ov.inter, 3)::geography), 0),
+    upper({schedule_a} * {schedule_b}) - lower({schedule_a} * {schedule_b})
+"""
+
+
+def proximity_sql(geom_a, geom_b):
+    """
+    Spatial part of the conflict predicate. With a buffer this is ST_DWithin
+    on geography, which the (geom::geography) GiST index on Location serves;
+    without one it falls back to the plain geometry ST_Intersects.
+    """
+    buffer_m = float(settings.CONFLICT_BUFFER_METERS)
+    if buffer_m > 0:
+        return f"ST_DWithin({geom_a}::geography, {geom_b}::geography, {buffer_m!r})"
+    return f"ST_Intersects({geom_a}, {geom_b})"
+
+
+def conflict_state(work):
+    """
+    Snapshot of the fields that decide a work's conflicts. Two works with the
+    same snapshot have the same conflict set, so a save that leaves it
+    unchanged (budget, details, Planned -> Ongoing, ...) skips the spatial scan.
+    """
+    return (
+        work.location_id,
+        work.is_active,
+        work.proposed_start_date,
+        work.proposed_end_date,
+        work.start_date,
+        work.end_date,
+    )
+
+
+def conflict_map(work_pks):
+    """{work pk: [(conflicting work pk, kind), ...]} for the given works, in one query."""
+    from base.models import WorkConflict
+
+    result = {pk: [] for pk in work_pks}
+    edges = WorkConflict.objects.filter(
+        Q(work_a_id__in=work_pks) | Q(work_b_id__in=work_pks)
+    ).values_list("work_a_id", "work_b_id", "kind")
+    for a, b, kind in edges:
+        if a in result:
+            result[a].append((b, kind))
+        if b in result:
+            result[b].append((a, kind))
+    return result
+
+
+def sync_work_conflicts(work):
+    """
+    Bring the conflict edges of `work` up to date in a single SQL statement:
+    the candidate set is computed with a GiST-backed spatial predicate (see
+    proximity_sql) plus a GiST-backed && on the `schedule` date range, edges to
+    works that are no longer candidates are deleted and the remaining ones
+    are upserted with freshly computed overlap metrics (the geometry or
+    schedule changed, otherwise we would not be here).
+    Inactive works, or works without a location, end up with no edges.
+    The conflict groups are then patched from the returned delta, in the
+    same transaction.
+    """
+    from base.models import Location, Work, WorkConflict
+
+    active = bool(work.is_active and work.location_id)
+    other = "CASE WHEN c.work_a_id = %(pk)s THEN c.work_b_id ELSE c.work_a_id END"
+
+    sql = f"""
+        WITH candidates AS (
+            SELECT w.uuid AS other, l.geom AS other_geom, w.schedule AS other_schedule,
+                   ml.geom AS my_geom, me.schedule AS my_schedule
+            FROM {Work._meta.db_table} me
+            JOIN {Location._meta.db_table} ml ON ml.uuid = me.location_id
+            JOIN {Location._meta.db_table} l ON {proximity_sql("l.geom", "ml.geom")}
+            JOIN {Work._meta.db_table} w ON w.location_id = l.uuid
+            WHERE %(active)s
+              AND me.uuid = %(pk)s
+              AND w.uuid <> me.uuid
+              AND w.status NOT IN %(inactive)s
+              AND w.schedule && me.schedule
+        ),
+        existing AS (
+            SELECT {other} AS other
+            FROM {WorkConflict._meta.db_table} c
+            WHERE c.work_a_id = %(pk)s OR c.work_b_id = %(pk)s
+        ),
+        removed AS (
+            DELETE FROM {WorkConflict._meta.db_table} c
+            WHERE (c.work_a_id = %(pk)s OR c.work_b_id = %(pk)s)
+              AND {other} NOT IN (SELECT other FROM candidates)
+            RETURNING {other} AS other
+        ),
+        upserted AS (
+            INSERT INTO {WorkConflict._meta.db_table}
+                (uuid, work_a_id, work_b_id, kind, distance, overlap_length, overlap_area, overlap_days,
+                 created_at, updated_at)
+            SELECT gen_random_uuid(), LEAST(%(pk)s::uuid, c.other), GREATEST(%(pk)s::uuid, c.other),
+                   {OVERLAP_METRICS_SQL.format(geom_a="c.my_geom", geom_b="c.other_geom",
+                                               schedule_a="c.my_schedule", schedule_b="c.other_schedule")},
+                   now(), now()
+            FROM candidates c
+            CROSS JOIN LATERAL (SELECT ST_Intersection(c.my_geom, c.other_geom) AS inter) ov
+            ON CONFLICT (work_a_id, work_b_id) DO UPDATE SET
+                kind = EXCLUDED.kind,
+                distance = EXCLUDED.distance,
+                overlap_length = EXCLUDED.overlap_length,
+                overlap_area = EXCLUDED.overlap_area,
+                overlap_days = EXCLUDED.overlap_days,
+                updated_at = EXCLUDED.updated_at
+        )
+        SELECT TRUE, other FROM candidates WHERE other NOT IN (SELECT other FROM existing)
+        UNION ALL
+        SELECT FALSE, other FROM removed
+    """
+    params = {
+        "pk": work.pk,
+        "active": active,
+        "inactive": tuple(Work.INACTIVE_STATUSES),
+    }
+    with transaction.atomic():
+        lock_conflict_groups()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            delta = cursor.fetchall()
+
+        added = [other for is_added, other in delta if is_added]
+        removed = [other for is_added, other in delta if not is_added]
+        if removed:
+            group_id = conflict_group_of(work.pk)
+            if group_id:
+                split_conflict_group(group_id)
+        if added:
+            merge_conflict_groups([work.pk, *added])
+
+
+def _location_hexewkb(geom):
+    """Hex EWKB of `geom` in Location.geom's SRID (GeoJSON input defaults to 4326)."""
+    from base.models import Location
+
+    srid = Location._meta.get_field("geom").srid
+    if geom.srid is None:
+        geom = geom.clone()
+        geom.srid = 4326
+    if geom.srid != srid:
+        geom = geom.transform(srid, clone=True)
+    return geom.hexewkb.decode()
+
+
+def check_candidates(candidates):
+    """
+    What-if conflict check, nothing is written. `candidates` is a list of
+    (GEOSGeometry, start date, end date); all of them are tested in a single
+    spatial join against the active works. Returns one list of
+    {"uuid", "name", "status", "kind", "distance"} per candidate, in order.
+    """
+    from base.models import Location, Work
+
+    results = [[] for _ in candidates]
+    if not candidates:
+        return results
+
+    geoms, starts, ends = [], [], []
+    for geom, start, end in candidates:
+        geoms.append(_location_hexewkb(geom))
+        starts.append(start)
+        ends.append(end)
+
+    sql = f"""
+        WITH cand AS (
+            SELECT t.idx, ST_GeomFromEWKB(decode(t.g, 'hex')) AS geom, daterange(t.s, t.e, '[]') AS span
+            FROM unnest(%s::int[], %s::text[], %s::date[], %s::date[]) AS t(idx, g, s, e)
+        )
+        SELECT c.idx, w.uuid, w.name, w.status,
+               CASE WHEN ST_Intersects(l.geom, c.geom) THEN 'Intersect' ELSE 'Near' END,
+               CASE WHEN ST_Intersects(l.geom, c.geom) THEN 0
+                    ELSE ST_Distance(l.geom::geography, c.geom::geography) END
+        FROM cand c
+        JOIN {Location._meta.db_table} l ON {proximity_sql("l.geom", "c.geom")}
+        JOIN {Work._meta.db_table} w ON w.location_id = l.uuid
+        WHERE w.status NOT IN %s
+          AND w.schedule && c.span
+        ORDER BY c.idx, w.proposed_start_date
+    """
+    params = [list(range(len(candidates))), geoms, starts, ends, tuple(Work.INACTIVE_STATUSES)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for idx, pk, name, status, kind, distance in cursor.fetchall():
+            results[idx].append({
+                "uuid": str(pk), "name": name, "status": status, "kind": kind, "distance": distance,
+            })
+    return results
+
+
+def busy_intervals(geom, not_before):
+    """
+    Schedules of the active works that would conflict with `geom` and are
+    not over before `not_before`, as sorted half-open (first day, day after
+    last) date pairs; the second one is None for open-ended works.
+    One query using the spatial and the schedule GiST indexes.
+    """
+    from base.models import Location, Work
+
+    sql = f"""
+        WITH cand AS (SELECT ST_GeomFromEWKB(decode(%s, 'hex')) AS geom)
+        SELECT lower(w.schedule), upper(w.schedule)
+        FROM cand c
+        JOIN {Location._meta.db_table} l ON {proximity_sql("l.geom", "c.geom")}
+        JOIN {Work._meta.db_table} w ON w.location_id = l.uuid
+        WHERE w.status NOT IN %s
+          AND w.schedule && daterange(%s, NULL, '[)')
+        ORDER BY 1
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [_location_hexewkb(geom), tuple(Work.INACTIVE_STATUSES), not_before])
+        return cursor.fetchall()
+
+
+def spatial_neighbours(work_pks, not_before):
+    """
+    Active works that are spatially close to any of `work_pks`, whatever their
+    schedule: rows of (work pk, neighbour pk, lower(schedule), upper(schedule)).
+    Neighbours outside `work_pks` that are over before `not_before` are left
+    out. The stored WorkConflict edges are no help here: they hold only pairs
+    whose current windows overlap, and rescheduling moves those windows.
+    """
+    from base.models import Location, Work
+
+    sql = f"""
+        SELECT me.uuid, w.uuid, lower(w.schedule), upper(w.schedule)
+        FROM {Work._meta.db_table} me
+        JOIN {Location._meta.db_table} ml ON ml.uuid = me.location_id
+        JOIN {Location._meta.db_table} l ON {proximity_sql("l.geom", "ml.geom")}
+        JOIN {Work._meta.db_table} w ON w.location_id = l.uuid
+        WHERE me.uuid = ANY(%(pks)s)
+          AND w.uuid <> me.uuid
+          AND w.status NOT IN %(inactive)s
+          AND (w.uuid = ANY(%(pks)s) OR w.schedule && daterange(%(not_before)s, NULL, '[)'))
+    """
+    params = {"pks": list(work_pks), "inactive": tuple(Work.INACTIVE_STATUSES), "not_before": not_before}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def sync_location_conflicts(location):
+    """Geometry of a location changed: refresh every work placed on it."""
+    with transaction.atomic():
+        for work in location.work_set.all():
+            sync_work_conflicts(work)
+
+
+# ---------- Conflict groups (union-find) ----------
+
+class UnionFind:
+    """Disjoint sets with union by size and path halving."""
+
+    def __init__(self, items=()):
+        self.parent = {}
+        self.size = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, x):
+        if x not in self.parent:
+            self.parent[x] = x
+            self.size[x] = 1
+
+    def find(self, x):
+        self.add(x)
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+        return ra
+
+    def components(self):
+        groups = {}
+        for x in self.parent:
+            groups.setdefault(self.find(x), []).append(x)
+        return list(groups.values())
+
+
+def conflict_group_of(work_pk):
+    from base.models import ConflictGroup
+    return ConflictGroup.objects.filter(work_id=work_pk).values_list("group_id", flat=True).first()
+
+
+def merge_conflict_groups(work_pks):
+    """
+    Union step for persisted groups: `work_pks` are now connected, so every
+    group they touch collapses into the largest one (union by size), and
+    members without a group join it. Runs in a constant number of queries.
+    """
+    from base.models import ConflictGroup
+
+    current = dict(ConflictGroup.objects.filter(work_id__in=work_pks).values_list("work_id", "group_id"))
+    group_ids = set(current.values())
+    if group_ids:
+        sizes = (
+            ConflictGroup.objects.filter(group_id__in=group_ids)
+            .values("group_id").annotate(n=Count("work_id"))
+        )
+        target = max(sizes, key=lambda row: row["n"])["group_id"]
+        others = group_ids - {target}
+        if others:
+            ConflictGroup.objects.filter(group_id__in=others).update(group_id=target)
+    else:
+        target = uuid.uuid4()
+
+    ConflictGroup.objects.bulk_create(
+        [ConflictGroup(work_id=pk, group_id=target) for pk in work_pks if pk not in current],
+        ignore_conflicts=True,
+    )
+    return target
+
+
+def group_components(members, edges):
+    """
+    Connected components of `members` under `edges` (pairs; edges leaving the
+    member set are ignored), largest first.
+    """
+    uf = UnionFind(members)
+    member_set = set(members)
+    for a, b in edges:
+        if a in member_set and b in member_set:
+            uf.union(a, b)
+    return sorted(uf.components(), key=len, reverse=True)
+
+
+def split_conflict_group(group_id):
+    """
+    Edges inside `group_id` were removed: recompute the components of that
+    group only. The largest component keeps the id, other components get
+    fresh ids and works left without any conflict drop out of the table.
+    """
+    from base.models import ConflictGroup, WorkConflict
+
+    members = list(ConflictGroup.objects.filter(group_id=group_id).values_list("work_id", flat=True))
+    edges = WorkConflict.objects.filter(work_a_id__in=members).values_list("work_a_id", "work_b_id")
+    components = group_components(members, edges)
+    if len(components) == 1 and len(components[0]) > 1:
+        return
+
+    singles = [pk for comp in components if len(comp) == 1 for pk in comp]
+    if singles:
+        ConflictGroup.objects.filter(work_id__in=singles).delete()
+    for comp in components[1:]:
+        if len(comp) > 1:
+            ConflictGroup.objects.filter(work_id__in=comp).update(group_id=uuid.uuid4())
+
+
+def rebuild_conflict_groups():
+    """Recompute every group from the full edge table (used after bulk rebuilds)."""
+    from base.models import ConflictGroup, WorkConflict
+
+    with transaction.atomic():
+        lock_conflict_groups()
+        uf = UnionFind()
+        edges = WorkConflict.objects.values_list("work_a_id", "work_b_id")
+        for a, b in edges.iterator(chunk_size=5000):
+            uf.union(a, b)
+
+        rows = []
+        for comp in uf.components():
+            group_id = uuid.uuid4()
+            rows.extend(ConflictGroup(work_id=pk, group_id=group_id) for pk in comp)
+
+        ConflictGroup.objects.all().delete()
+        ConflictGroup.objects.bulk_create(rows, batch_size=5000)
+    return len(rows)
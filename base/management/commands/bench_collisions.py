@@ -0,0 +1,83 @@
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.api import shortest_path_utils as spu
+
+
+def synthetic_route(n_points, seed=0, origin=(90.3996, 23.7768), step_m=15.0):
+    """Random-walk polyline of n_points [lon, lat] pairs with a drifting heading, like a TomTom leg."""
+    rng = random.Random(seed)
+    lon, lat = origin
+    heading = rng.uniform(0, 2 * math.pi)
+    coords = [[lon, lat]]
+    for _ in range(n_points - 1):
+        heading += rng.gauss(0, 0.3)
+        d = step_m * rng.uniform(0.5, 1.5)
+        lon += d * math.cos(heading) / spu.meters_per_deg_lon(lat)
+        lat += d * math.sin(heading) / spu.meters_per_deg_lat()
+        coords.append([lon, lat])
+    return coords
+
+
+def synthetic_rects(coords, n_rects, seed=0, spread_m=800.0):
+    """Scaled work rectangles scattered around the route."""
+    rng = random.Random(seed + 1)
+    rects = []
+    for _ in range(n_rects):
+        lon, lat = rng.choice(coords)
+        lon += rng.uniform(-spread_m, spread_m) / spu.meters_per_deg_lon(lat)
+        lat += rng.uniform(-spread_m, spread_m) / spu.meters_per_deg_lat()
+        w = rng.uniform(10, 200) / spu.meters_per_deg_lon(lat)
+        h = rng.uniform(10, 200) / spu.meters_per_deg_lat()
+        rects.append(spu.scale_rect_reasonably([lon, lat, lon + w, lat + h]))
+    return rects
+
+
+def _timed(fn, repeat):
+    timings, result = [], None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings), result
+
+
+class Command(BaseCommand):
+    help = "Benchmark the vectorized route/avoid-rectangle collision engine against the scalar one."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--points", type=int, default=5000, help="Route polyline points (default: 5000)")
+        parser.add_argument("--rects", type=int, default=500, help="Avoid rectangles (default: 500)")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs, best one is reported (default: 5)")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if spu.np is None:
+            raise CommandError("numpy is not installed, only the scalar engine is available")
+
+        coords = synthetic_route(options["points"], seed=options["seed"])
+        specs = synthetic_rects(coords, options["rects"], seed=options["seed"])
+        idx, rects = spu.build_rect_index_from_array_of_arrays(specs)
+        self.stdout.write(f"{len(coords) - 1} segments, {len(rects)} rectangles")
+
+        scalar_s, expected = _timed(lambda: spu._path_collisions_scalar(idx, rects, coords), options["repeat"])
+        vector_s, got = _timed(lambda: spu._path_collisions_vectorized(idx, rects, coords), options["repeat"])
+
+        # same earliest hit, and the same rect on ties, for every segment
+        if len(expected) != len(got):
+            raise CommandError(f"Engines found {len(expected)} vs {len(got)} colliding segments")
+        for e, g in zip(expected, got):
+            if e["segment_index"] != g["segment_index"] or e["rect_id"] != g["rect_id"] \
+                    or abs(e["t"] - g["t"]) > 1e-9 \
+                    or abs(e["hit_point"].x - g["hit_point"].x) > 1e-9 \
+                    or abs(e["hit_point"].y - g["hit_point"].y) > 1e-9:
+                raise CommandError(f"Engines disagree at segment {e['segment_index']}: {e} vs {g}")
+
+        self.stdout.write(
+            f"{len(got)} colliding segments; scalar {scalar_s * 1000:.1f} ms, "
+            f"vectorized {vector_s * 1000:.1f} ms ({scalar_s / vector_s:.1f}x)"
+        )
+        self.stdout.write(self.style.SUCCESS("Engines agree"))
@@ -0,0 +1,129 @@
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from base.api.avoid_index import AvoidIndex
+from base.api.tomtom_standin import StandinServer
+from base.management.commands.bench_collisions import synthetic_rects, synthetic_route
+
+
+def pct(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def synthetic_trips(n, seed=0, bbox=(90.36, 23.72, 90.45, 23.84)):
+    """n 'lat,lon' origin/destination string pairs inside bbox (central Dhaka by default)."""
+    rng = random.Random(seed)
+    minx, miny, maxx, maxy = bbox
+    def point():
+        return f"{rng.uniform(miny, maxy):.6f},{rng.uniform(minx, maxx):.6f}"
+    return [(point(), point()) for _ in range(n)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test routing against the local TomTom stand-in: iterations per solve, wall time "
+        "and p50/p95/p99 latency for routeProbSolver or the /api/shortrouting/ view."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", choices=["solver", "view"], default="solver",
+                            help="solver: synthetic works, no DB; view: the real view and the works in the DB")
+        parser.add_argument("--requests", type=int, default=200, help="Solves to run (default: 200)")
+        parser.add_argument("--concurrency", type=int, default=8, help="Solves in flight at once (default: 8)")
+        parser.add_argument("--rects", type=int, default=300, help="Synthetic works for --target solver (default: 300)")
+        parser.add_argument("--latency-ms", type=float, default=80.0, help="Stand-in latency per call (default: 80)")
+        parser.add_argument("--jitter-ms", type=float, default=40.0)
+        parser.add_argument("--error-rate", type=float, default=0.0)
+        parser.add_argument("--replay-dir", help="Recorded responses for the stand-in")
+        parser.add_argument("--cache", action="store_true", help="Keep the route cache on (off by default)")
+        parser.add_argument("--city", default="", help="city filter for --target view")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        server = StandinServer(
+            ("127.0.0.1", 0),
+            replay_dir=options["replay_dir"],
+            latency_ms=options["latency_ms"],
+            jitter_ms=options["jitter_ms"],
+            error_rate=options["error_rate"],
+            seed=options["seed"],
+        )
+        server.start_in_thread()
+        trips = synthetic_trips(options["requests"], seed=options["seed"])
+
+        try:
+            with override_settings(
+                TOMTOM_BASE_URL=server.base_url,
+                TOMTOM_API_KEY=settings.TOMTOM_API_KEY or "standin",
+                ROUTING_BACKEND="tomtom",
+                ROUTE_CACHE={"ENABLED": options["cache"]},
+            ):
+                run_one = self._solver_runner(options) if options["target"] == "solver" else self._view_runner(options)
+                t0 = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=max(1, options["concurrency"])) as pool:
+                    results = list(pool.map(run_one, trips))
+                wall = time.perf_counter() - t0
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        ok = [r for r in results if r["error"] is None]
+        if not ok:
+            raise CommandError(f"Every solve failed, first error: {results[0]['error']}")
+        lat = sorted(r["latency"] for r in ok)
+        iters = [r["iterations"] for r in ok]
+        self.stdout.write(
+            f"{len(results)} solves ({len(results) - len(ok)} failed) in {wall:.2f}s wall, "
+            f"{len(results) / wall:.1f} solves/s at concurrency {options['concurrency']}"
+        )
+        self.stdout.write(
+            f"iterations per solve: mean {statistics.mean(iters):.2f}, max {max(iters)}; "
+            f"stand-in calls {server.requests} ({server.replayed} replayed)"
+        )
+        self.stdout.write(
+            f"latency p50 {pct(lat, 0.50) * 1000:.0f} ms, p95 {pct(lat, 0.95) * 1000:.0f} ms, "
+            f"p99 {pct(lat, 0.99) * 1000:.0f} ms, max {lat[-1] * 1000:.0f} ms"
+        )
+
+    def _solver_runner(self, options):
+        from base.api.shortest_path_utils import routeProbSolver
+
+        coords = synthetic_route(2000, seed=options["seed"])
+        avoid_index = AvoidIndex(synthetic_rects(coords, options["rects"], seed=options["seed"]))
+
+        def run(trip):
+            stats = {}
+            t0 = time.perf_counter()
+            try:
+                routeProbSolver(None, trip[0], trip[1], stats=stats, avoid_index=avoid_index)
+                error = None
+            except Exception as e:
+                error = str(e)
+            return {"latency": time.perf_counter() - t0, "iterations": stats.get("iterations", 0), "error": error}
+        return run
+
+    def _view_runner(self, options):
+        from rest_framework.test import APIRequestFactory
+
+        from base.api.views import ShortRoutesAPIView
+
+        factory = APIRequestFactory()
+        view = ShortRoutesAPIView.as_view()
+
+        def run(trip):
+            body = {"orig_str": trip[0], "dest_str": trip[1]}
+            if options["city"]:
+                body["city"] = options["city"]
+            t0 = time.perf_counter()
+            response = view(factory.post("/api/shortrouting/", body, format="json"))
+            latency = time.perf_counter() - t0
+            if response.status_code != 200:
+                return {"latency": latency, "iterations": 0, "error": f"HTTP {response.status_code}: {response.data}"}
+            return {"latency": latency, "iterations": response.data["iterations"], "error": None}
+        return run
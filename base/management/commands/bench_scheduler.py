@@ -0,0 +1,75 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.api.scheduling_utils import Job, solve_schedule
+
+
+def synthetic_jobs(n, seed=0, horizon_days=365, cluster_size=12, extra_degree=2):
+    """
+    n proposed works spread over `horizon_days`, grouped into road-corridor
+    clusters (dense conflicts inside a cluster) plus a few random cross edges.
+    """
+    rng = random.Random(seed)
+    jobs = []
+    for i in range(n):
+        release = rng.randrange(horizon_days)
+        duration = rng.randint(1, 30)
+        jobs.append(Job(i, duration, release, release + duration + rng.randint(0, 20), rng.random() < 0.1))
+
+    edges = set()
+    for base in range(0, n, cluster_size):
+        members = list(range(base, min(base + cluster_size, n)))
+        for a in members:
+            for b in rng.sample(members, min(4, len(members))):
+                if a < b:
+                    edges.add((a, b))
+    for _ in range(n * extra_degree // 2):
+        a, b = rng.randrange(n), rng.randrange(n)
+        if a != b:
+            edges.add((min(a, b), max(a, b)))
+    return jobs, sorted(edges)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the conflict-free scheduling heuristic on synthetic proposed works."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--works", type=int, default=10000, help="Number of proposed works (default: 10000)")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs, best one is reported (default: 5)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--budget", type=float, default=1.0,
+            help="Fail if the best run takes longer than this many seconds (default: 1.0)",
+        )
+
+    def handle(self, *args, **options):
+        jobs, edges = synthetic_jobs(options["works"], seed=options["seed"])
+        self.stdout.write(f"{len(jobs)} works, {len(edges)} conflict edges")
+
+        timings = []
+        for _ in range(max(1, options["repeat"])):
+            for j in jobs:
+                j.start = None
+            t0 = time.perf_counter()
+            solve_schedule(jobs, edges)
+            timings.append(time.perf_counter() - t0)
+
+        # the result must actually be conflict-free
+        by_id = {j.id: j for j in jobs}
+        for a, b in edges:
+            ja, jb = by_id[a], by_id[b]
+            if ja.start < jb.end and jb.start < ja.end:
+                raise CommandError(f"Works {a} and {b} overlap")
+
+        late = sum(1 for j in jobs if j.tardiness() > 0)
+        delay = sum(j.start - j.release for j in jobs) / len(jobs)
+        best = min(timings)
+        self.stdout.write(
+            f"best {best * 1000:.1f} ms, median {sorted(timings)[len(timings) // 2] * 1000:.1f} ms; "
+            f"{late} late, mean delay {delay:.1f} days"
+        )
+        if best > options["budget"]:
+            raise CommandError(f"Scheduling took {best:.3f}s, budget is {options['budget']:.3f}s")
+        self.stdout.write(self.style.SUCCESS("Within budget"))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.api.road_graph import RoadGraph
+
+
+class Command(BaseCommand):
+    help = "Convert an OSM XML extract into the compact .graph file the offline routing backend loads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("extract", help="OSM XML extract (.osm, .osm.gz or .osm.bz2)")
+        parser.add_argument("output", help="Where to write the graph, must end in .graph")
+
+    def handle(self, *args, **options):
+        if not options["output"].endswith(".graph"):
+            raise CommandError("output must end in .graph")
+
+        t0 = time.perf_counter()
+        try:
+            graph = RoadGraph.from_osm(options["extract"])
+        except (OSError, SyntaxError) as e:
+            raise CommandError(f"Could not read {options['extract']}: {e}")
+        if not graph.edge_count:
+            raise CommandError("No drivable roads found in the extract")
+        graph.save(options["output"])
+
+        self.stdout.write(
+            f"{graph.node_count} nodes, {graph.edge_count} edges in {time.perf_counter() - t0:.1f}s"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
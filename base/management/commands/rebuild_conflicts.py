@@ -0,0 +1,222 @@
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Q
+
+from base.conflicts import (
+    OVERLAP_METRICS_SQL, lock_conflict_groups, proximity_sql, rebuild_conflict_groups, sync_work_conflicts,
+)
+from base.models import Location, Work, WorkConflict
+
+
+# Every pair is produced exactly once (a.uuid < b.uuid, the WorkConflict
+# canonical order) and owned by the partition of its left-hand location, so
+# partitions never overlap.
+PAIRS_SQL = """
+    SELECT a.uuid, b.uuid, {metrics}
+    FROM {work} a
+    JOIN {location} la ON la.uuid = a.location_id
+    JOIN {location} lb ON {proximity}
+    JOIN {work} b ON b.location_id = lb.uuid
+    CROSS JOIN LATERAL (SELECT ST_Intersection(la.geom, lb.geom) AS inter) ov
+    WHERE a.uuid < b.uuid
+      AND a.status NOT IN %s
+      AND b.status NOT IN %s
+      AND a.schedule && b.schedule
+      AND {partition}
+"""
+
+CITY_PARTITION = "la.city = %s"
+# the envelope test uses the spatial index; the point-on-surface cell only
+# decides which of the cells a location overlaps owns it
+GRID_PARTITION = (
+    "la.geom && ST_MakeEnvelope(%s, %s, %s, %s, {srid}) "
+    "AND floor(ST_X(ST_PointOnSurface(la.geom)) / %s) = %s "
+    "AND floor(ST_Y(ST_PointOnSurface(la.geom)) / %s) = %s"
+)
+GRID_CELLS_SQL = """
+    SELECT DISTINCT
+        floor(ST_X(ST_PointOnSurface(geom)) / %s),
+        floor(ST_Y(ST_PointOnSurface(geom)) / %s)
+    FROM {location}
+"""
+
+
+# Partitions write into this unlogged copy of the WorkConflict table; it is
+# swapped in (with the conflict groups) in one transaction once every
+# partition succeeded, so readers never see a half-built graph. Saves made
+# while the partitions ran are replayed on top of it in that transaction.
+STAGING_TABLE = "base_workconflict_rebuild"
+STAGING_COLUMNS = (
+    "uuid", "work_a_id", "work_b_id", "kind", "distance", "overlap_length", "overlap_area", "overlap_days",
+)
+
+
+def _init_worker():
+    # Under "spawn" the child starts from scratch; under "fork" this is a no-op.
+    import django
+    django.setup()
+
+
+def _insert_staging(cursor, rows):
+    values = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, now(), now())"] * len(rows))
+    cursor.execute(
+        f"INSERT INTO {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}, created_at, updated_at) VALUES {values}",
+        [v for row in rows for v in row],
+    )
+
+
+def _rebuild_partition(partition_sql, partition_params, batch_size):
+    """Stream the pairs of one partition into the staging table with their overlap metrics."""
+    inactive = tuple(Work.INACTIVE_STATUSES)
+    sql = PAIRS_SQL.format(
+        metrics=OVERLAP_METRICS_SQL.format(
+            geom_a="la.geom", geom_b="lb.geom", schedule_a="a.schedule", schedule_b="b.schedule",
+        ),
+        proximity=proximity_sql("la.geom", "lb.geom"),
+        work=Work._meta.db_table,
+        location=Location._meta.db_table,
+        partition=partition_sql,
+    )
+
+    created = 0
+    batch = []
+    with transaction.atomic():
+        connection.ensure_connection()
+        # named cursor -> server-side, rows arrive in chunks of `itersize`
+        with connection.connection.cursor(name="rebuild_conflicts") as cursor:
+            cursor.itersize = batch_size
+            cursor.execute(sql, [inactive, inactive, *partition_params])
+            with connection.cursor() as writer:
+                for row in cursor:
+                    batch.append((uuid.uuid4(), *row))
+                    if len(batch) >= batch_size:
+                        _insert_staging(writer, batch)
+                        created += len(batch)
+                        batch = []
+                if batch:
+                    _insert_staging(writer, batch)
+                    created += len(batch)
+    return created
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the whole work conflicts graph from scratch with one PostGIS "
+        "self-join per partition (city or grid cell), run across a process pool "
+        "into a staging table, then swap it in and reassign conflict groups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Number of worker processes (default: 4)")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per fetch and per bulk insert (default: 5000)")
+        parser.add_argument(
+            "--partition", choices=["city", "grid"], default="city",
+            help="Split the work by Location.city or by a square grid cell (default: city)",
+        )
+        parser.add_argument(
+            "--cell-size", type=float, default=0.05,
+            help="Grid cell size in geometry units, used with --partition grid (default: 0.05)",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        batch_size = options["batch_size"]
+        if workers < 1 or batch_size < 1:
+            raise CommandError("--workers and --batch-size must be positive")
+
+        partitions = self._partitions(options["partition"], options["cell_size"])
+
+        table = WorkConflict._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT now()")
+            started = cursor.fetchone()[0]
+            cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+            cursor.execute(f"CREATE UNLOGGED TABLE {STAGING_TABLE} (LIKE {table} INCLUDING DEFAULTS)")
+        self.stdout.write(f"Rebuilding {len(partitions)} partition(s)")
+
+        try:
+            total, failed = self._run_partitions(partitions, workers, batch_size)
+            if failed:
+                raise CommandError(
+                    f"{len(failed)} partition(s) failed, conflicts graph left unchanged: "
+                    + "; ".join(f"{label}: {error}" for label, error in failed)
+                )
+
+            columns = ", ".join((*STAGING_COLUMNS, "created_at", "updated_at"))
+            with transaction.atomic():
+                # same lock order as the per-save sync: groups lock, then edges
+                lock_conflict_groups()
+                with connection.cursor() as cursor:
+                    # no edge writes from saves while the table is swapped
+                    cursor.execute(f"LOCK TABLE {table} IN EXCLUSIVE MODE")
+                    cursor.execute(f"DELETE FROM {table}")
+                    # works deleted or moved off their location meanwhile
+                    # must not come back through the snapshot
+                    placed = (
+                        f"SELECT uuid FROM {Work._meta.db_table} "
+                        "WHERE location_id IS NOT NULL AND status NOT IN %s"
+                    )
+                    cursor.execute(
+                        f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {STAGING_TABLE} "
+                        f"WHERE work_a_id IN ({placed}) AND work_b_id IN ({placed}) "
+                        "ON CONFLICT DO NOTHING",
+                        [tuple(Work.INACTIVE_STATUSES)] * 2,
+                    )
+                # the snapshot predates saves committed while it was built
+                changed = Work.objects.filter(Q(updated_at__gte=started) | Q(location__updated_at__gte=started))
+                for work in changed.iterator(chunk_size=500):
+                    sync_work_conflicts(work)
+                grouped = rebuild_conflict_groups()
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt conflicts graph: {total} edges, {grouped} works in conflict groups"
+        ))
+
+    def _run_partitions(self, partitions, workers, batch_size):
+        """Fill the staging table; returns (edges written, [(label, error) of failed partitions])."""
+        # children must open their own connections, never share the parent's socket
+        connections.close_all()
+
+        total, failed = 0, []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {
+                pool.submit(_rebuild_partition, sql, params, batch_size): label
+                for label, sql, params in partitions
+            }
+            for future in as_completed(futures):
+                label = futures[future]
+                try:
+                    created = future.result()
+                except Exception as e:
+                    failed.append((label, e))
+                    self.stderr.write(f"  {label}: failed ({e})")
+                    continue
+                total += created
+                self.stdout.write(f"  {label}: {created} edges")
+        return total, failed
+
+    def _partitions(self, mode, cell_size):
+        if mode == "city":
+            cities = Location.objects.values_list("city", flat=True).distinct().order_by("city")
+            return [(f"city={city}", CITY_PARTITION, [city]) for city in cities]
+
+        if cell_size <= 0:
+            raise CommandError("--cell-size must be positive")
+        with connection.cursor() as cursor:
+            cursor.execute(GRID_CELLS_SQL.format(location=Location._meta.db_table), [cell_size, cell_size])
+            cells = cursor.fetchall()
+        partition_sql = GRID_PARTITION.format(srid=Location._meta.get_field("geom").srid)
+        return [
+            (
+                f"cell=({cx:g},{cy:g})", partition_sql,
+                [cx * cell_size, cy * cell_size, (cx + 1) * cell_size, (cy + 1) * cell_size,
+                 cell_size, cx, cell_size, cy],
+            )
+            for cx, cy in cells
+        ]
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from base.api.shortest_path_utils import BASE
+from base.api.tomtom_standin import StandinServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a local stand-in for TomTom calculateRoute (recorded or synthetic routes). "
+        "Point settings.TOMTOM_BASE_URL at the printed URL. With --record, misses are "
+        "fetched from the real API and saved into --replay-dir."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--replay-dir", help="Directory of recorded responses named <replay_key>.json")
+        parser.add_argument(
+            "--record", nargs="?", const=BASE,
+            metavar="URL", help="Forward misses to URL (default: the TomTom API) and record them into --replay-dir",
+        )
+        parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per call (default: 0)")
+        parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter on the latency")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with 503")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options["record"] and not options["replay_dir"]:
+            raise CommandError("--record needs --replay-dir")
+        server = StandinServer(
+            (options["host"], options["port"]),
+            replay_dir=options["replay_dir"],
+            record_url=options["record"],
+            latency_ms=options["latency_ms"],
+            jitter_ms=options["jitter_ms"],
+            error_rate=options["error_rate"],
+            seed=options["seed"],
+        )
+        self.stdout.write(f"TomTom stand-in on {server.base_url} (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"{server.requests} requests, {server.replayed} replayed, {server.recorded} recorded")
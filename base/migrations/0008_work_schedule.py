@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:12
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+# Backfill mirrors Work.schedule_range(): actual dates once set, proposed otherwise,
+# open-ended when a started work overran its proposed end.
+BACKFILL_SCHEDULE = """
+UPDATE base_work SET schedule = daterange(
+    COALESCE(start_date, proposed_start_date),
+    CASE
+        WHEN COALESCE(end_date, proposed_end_date) < COALESCE(start_date, proposed_start_date) THEN NULL
+        ELSE COALESCE(end_date, proposed_end_date)
+    END,
+    '[]'
+);
+"""
+
+# Conflicts are now spatio-temporal: drop edges between works that never overlap in time.
+PRUNE_CONFLICTS = """
+DELETE FROM base_work_conflicts c
+USING base_work a, base_work b
+WHERE a.uuid = c.from_work_id
+  AND b.uuid = c.to_work_id
+  AND NOT (a.schedule && b.schedule);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0007_alter_work_conflicts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='work',
+            name='schedule',
+            field=django.contrib.postgres.fields.ranges.DateRangeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='work',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['schedule'], name='work_schedule_gist'),
+        ),
+        migrations.RunSQL(BACKFILL_SCHEDULE, migrations.RunSQL.noop),
+        migrations.RunSQL(PRUNE_CONFLICTS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_groups(apps, schema_editor):
+    import uuid
+    from base.conflicts import UnionFind
+
+    Work = apps.get_model('base', 'Work')
+    ConflictGroup = apps.get_model('base', 'ConflictGroup')
+
+    uf = UnionFind()
+    for a, b in Work.conflicts.through.objects.values_list('from_work_id', 'to_work_id').iterator():
+        uf.union(a, b)
+
+    rows = []
+    for comp in uf.components():
+        group_id = uuid.uuid4()
+        rows.extend(ConflictGroup(work_id=pk, group_id=group_id) for pk in comp)
+    ConflictGroup.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_work_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConflictGroup',
+            fields=[
+                ('work', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='conflict_group', serialize=False, to='base.work')),
+                ('group_id', models.UUIDField(db_index=True)),
+            ],
+        ),
+        migrations.RunPython(build_groups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:05
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+# Move the symmetric M2M rows (two per pair) into WorkConflict (one per pair),
+# computing the overlap metrics on the way.
+COPY_EDGES = """
+INSERT INTO base_workconflict
+    (uuid, work_a_id, work_b_id, overlap_length, overlap_area, overlap_days, created_at, updated_at)
+SELECT gen_random_uuid(), a.uuid, b.uuid,
+       COALESCE(ST_Length(ST_CollectionExtract(ov.inter, 2)::geography), 0),
+       COALESCE(ST_Area(ST_CollectionExtract(ov.inter, 3)::geography), 0),
+       upper(a.schedule * b.schedule) - lower(a.schedule * b.schedule),
+       now(), now()
+FROM base_work_conflicts c
+JOIN base_work a ON a.uuid = c.from_work_id
+JOIN base_work b ON b.uuid = c.to_work_id
+JOIN base_location la ON la.uuid = a.location_id
+JOIN base_location lb ON lb.uuid = b.location_id
+CROSS JOIN LATERAL (SELECT ST_Intersection(la.geom, lb.geom) AS inter) ov
+WHERE c.from_work_id < c.to_work_id
+ON CONFLICT (work_a_id, work_b_id) DO NOTHING;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0009_conflictgroup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkConflict',
+            fields=[
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('overlap_length', models.FloatField(default=0, help_text='Length of the shared geometry in metres')),
+                ('overlap_area', models.FloatField(default=0, help_text='Area of the shared geometry in square metres')),
+                ('overlap_days', models.IntegerField(blank=True, help_text='Days both works are scheduled; empty if open-ended', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('work_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conflicts_as_a', to='base.work')),
+                ('work_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conflicts_as_b', to='base.work')),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint(fields=('work_a', 'work_b'), name='workconflict_unique_pair'),
+                    models.CheckConstraint(condition=models.Q(('work_a__lt', models.F('work_b'))), name='workconflict_canonical_pair'),
+                ],
+            },
+        ),
+        migrations.RunSQL(COPY_EDGES, migrations.RunSQL.noop),
+        migrations.RemoveField(
+            model_name='work',
+            name='conflicts',
+        ),
+    ]
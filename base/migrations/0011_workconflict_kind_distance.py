@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_workconflict_remove_work_conflicts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workconflict',
+            name='kind',
+            field=models.CharField(choices=[('Intersect', 'Intersect'), ('Near', 'Near')], default='Intersect', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='workconflict',
+            name='distance',
+            field=models.FloatField(default=0, help_text='Gap between the two geometries in metres, 0 when they intersect'),
+        ),
+        # Serves ST_DWithin(geom::geography, ..., metres) in the proximity check;
+        # the expression must match the `geom::geography` cast used in base.conflicts.
+        migrations.RunSQL(
+            "CREATE INDEX location_geom_geography_gist ON base_location USING GIST ((geom::geography));",
+            "DROP INDEX IF EXISTS location_geom_geography_gist;",
+        ),
+    ]
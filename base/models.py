@@ -1,9 +1,13 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.contrib.gis.db import models as gis_models
+from django.contrib.postgres.fields import DateRangeField
+from django.contrib.postgres.indexes import GistIndex
+from django.db.backends.postgresql.psycopg_any import DateRange
 from django.core.exceptions import ValidationError
 import uuid
 
+from base.conflicts import conflict_map, conflict_state, sync_location_conflicts, sync_work_conflicts
 
 
 # Custom user manager
@@ -72,6 +76,24 @@ class Location(models.Model):
     def __str__(self):
         return f"Location: ({self.city})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the loaded geometry so save() can tell if it moved
+        instance._loaded_geom = instance.__dict__.get("geom")
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, "_loaded_geom", None)
+        geom_changed = loaded is not None and (
+            self.geom is None or not loaded.equals_exact(self.geom)
+        )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if geom_changed:
+                sync_location_conflicts(self)
+        self._loaded_geom = self.geom
+
 
 
 class Work(models.Model):
@@ -87,6 +109,10 @@ class Work(models.Model):
         ("Ongoing", "Ongoing"),
         ("Completed", "Completed"),
     ]
+    # works in these states never take part in conflicts
+    INACTIVE_STATUSES = ("Declined", "Completed")
+    SCHEDULE_FIELDS = frozenset({"proposed_start_date", "proposed_end_date", "start_date", "end_date"})
+
     uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     stakeholder = models.ForeignKey(User, on_delete=models.CASCADE)
     location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True)
@@ -102,17 +128,103 @@ class Work(models.Model):
     budget = models.DecimalField(max_digits=12, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    # conflicts = models.ManyToManyField('self', null=True, blank=True, default=None)  # Self-referential ManyToManyField to indicate conflicts
-    conflicts = models.ManyToManyField('self', blank=True, symmetrical=True)
+    # Effective schedule window, kept in sync by save(); GiST-indexed for overlap (&&) lookups
+    schedule = DateRangeField(null=True, blank=True, editable=False)
+    # Conflicts live in WorkConflict, one row per unordered pair (see conflict_ids())
+
+    class Meta:
+        indexes = [
+            GistIndex(fields=["schedule"], name="work_schedule_gist"),
+        ]
 
     def __str__(self):
         return f"Work: {self.name} at {self.location.name if self.location else 'N/A'}"
     
+    @property
+    def is_active(self):
+        return self.status not in self.INACTIVE_STATUSES
+
+    def conflict_ids(self, kind=None):
+        """UUIDs of the works this one conflicts with, optionally only one WorkConflict kind."""
+        return [pk for pk, k in conflict_map([self.pk]).get(self.pk, []) if kind is None or k == kind]
+
+    def schedule_range(self):
+        """
+        Inclusive date window the work occupies: actual start/end once set,
+        otherwise the proposed ones. A work that started but overran its
+        proposed end without an end_date stays open-ended.
+        """
+        lower = self.start_date or self.proposed_start_date
+        upper = self.end_date or self.proposed_end_date
+        if lower is None:
+            return None
+        if upper is not None and upper < lower:
+            upper = None
+        return DateRange(lower, upper, "[]")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # skip the snapshot for deferred loads, save() then always recomputes
+        if not instance.get_deferred_fields():
+            instance._conflict_state = conflict_state(instance)
+        return instance
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        if self.location and self.location.geom:
-            conflicts_qs = Work.objects.exclude(pk=self.pk).filter(location__geom__intersects=self.location.geom)
-            self.conflicts.set(conflicts_qs)
+        self.schedule = self.schedule_range()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not self.SCHEDULE_FIELDS.isdisjoint(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"schedule"}
+        state = conflict_state(self)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if state != getattr(self, "_conflict_state", None):
+                sync_work_conflicts(self)
+        self._conflict_state = state
+
+
+class ConflictGroup(models.Model):
+    """
+    Connected component of the conflicts graph a work belongs to.
+    Works without any conflict have no row.
+    """
+    work = models.OneToOneField(Work, on_delete=models.CASCADE, primary_key=True, related_name="conflict_group")
+    group_id = models.UUIDField(db_index=True)
+
+    def __str__(self):
+        return f"ConflictGroup: {self.group_id} ({self.work_id})"
+
+
+class WorkConflict(models.Model):
+    """
+    Conflict edge between two works, stored once per unordered pair
+    (work_a < work_b). Overlap metrics are computed in SQL when the edge is
+    written, so listing conflicts by severity never touches geometry.
+    "Near" edges do not intersect but lie within CONFLICT_BUFFER_METERS.
+    """
+    KIND_CHOICES = [
+        ("Intersect", "Intersect"),
+        ("Near", "Near"),
+    ]
+    uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    work_a = models.ForeignKey(Work, on_delete=models.CASCADE, related_name="conflicts_as_a")
+    work_b = models.ForeignKey(Work, on_delete=models.CASCADE, related_name="conflicts_as_b")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default="Intersect")
+    distance = models.FloatField(default=0, help_text="Gap between the two geometries in metres, 0 when they intersect")
+    overlap_length = models.FloatField(default=0, help_text="Length of the shared geometry in metres")
+    overlap_area = models.FloatField(default=0, help_text="Area of the shared geometry in square metres")
+    overlap_days = models.IntegerField(null=True, blank=True, help_text="Days both works are scheduled; empty if open-ended")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["work_a", "work_b"], name="workconflict_unique_pair"),
+            models.CheckConstraint(condition=models.Q(work_a__lt=models.F("work_b")), name="workconflict_canonical_pair"),
+        ]
+
+    def __str__(self):
+        return f"WorkConflict: {self.work_a_id} <-> {self.work_b_id}"
 
 
 class Notice(models.Model):
@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from base.api.avoid_index import bump_avoid_index_version
+from base.conflicts import conflict_group_of, lock_conflict_groups, split_conflict_group, sync_work_conflicts
+from base.models import Location, Work
+
+
+# Cached avoid-rectangle indexes (base/api/avoid_index.py) are built from
+# Work/Location rows; any write moves the version on. The bump waits for the
+# commit so no reader rebuilds from rows that are not visible yet and caches
+# that under the new version.
+
+@receiver(post_save, sender=Work)
+@receiver(post_delete, sender=Work)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def invalidate_avoid_index(sender, **kwargs):
+    transaction.on_commit(bump_avoid_index_version)
+
+
+# Conflict maintenance on delete. Receivers rather than delete() overrides,
+# so queryset deletes (admin "delete selected") and cascades (deleting a
+# stakeholder) are covered too. pre_delete runs inside the delete's
+# transaction, before any row goes.
+
+@receiver(pre_delete, sender=Work)
+def remember_conflict_group(sender, instance, **kwargs):
+    # lock first: the work's group may be merged away concurrently
+    lock_conflict_groups()
+    instance._deleted_group_id = conflict_group_of(instance.pk)
+
+
+@receiver(post_delete, sender=Work)
+def split_group_of_deleted_work(sender, instance, **kwargs):
+    # the work's edges and group row are gone by now (cascade)
+    group_id = getattr(instance, "_deleted_group_id", None)
+    if group_id:
+        split_conflict_group(group_id)
+
+
+@receiver(pre_delete, sender=Location)
+def remember_placed_works(sender, instance, **kwargs):
+    instance._placed_work_pks = list(instance.work_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Location)
+def resync_unplaced_works(sender, instance, **kwargs):
+    # Work.location is SET_NULL: these works lost their location, and with
+    # it every conflict edge
+    for work in Work.objects.filter(pk__in=getattr(instance, "_placed_work_pks", [])):
+        sync_work_conflicts(work)
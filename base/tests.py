@@ -1,3 +1,266 @@
-from django.test import TestCase
+from datetime import date
 
-# Create your tests here.
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from base.api import shortest_path_utils as spu
+from base.api.avoid_index import AvoidIndex
+from base.api.road_graph import RoadGraph, haversine_m, offline_route
+from base.api.shortest_path_utils import coalesce_rects, meters_per_deg_lat, meters_per_deg_lon
+from base.api.scheduling_utils import INF, Job, earliest_fit, solve_schedule, split_neighbours
+from base.conflicts import UnionFind, group_components
+from base.management.commands.bench_collisions import synthetic_rects, synthetic_route
+
+
+def _box(lon, lat, w_m=100.0, h_m=100.0):
+    """[minLon, minLat, maxLon, maxLat] of a w_m x h_m box with its SW corner at lon, lat."""
+    return [lon, lat, lon + w_m / meters_per_deg_lon(lat), lat + h_m / meters_per_deg_lat()]
+
+
+def _covers(outer, inner):
+    eps = 1e-12
+    return (outer[0] <= inner[0] + eps and outer[1] <= inner[1] + eps
+            and outer[2] >= inner[2] - eps and outer[3] >= inner[3] - eps)
+
+
+class CoalesceRectsTests(SimpleTestCase):
+    def test_disjoint_rects_under_the_limit_are_kept_as_is(self):
+        rects = [_box(90.40 + 0.01 * k, 23.78) for k in range(4)]
+        self.assertEqual(coalesce_rects(rects, max_count=10, gap_m=30, max_inflation=1.5), rects)
+
+    def test_overlapping_rects_merge_into_one_covering_box(self):
+        a = _box(90.40, 23.78)
+        b = _box(90.40 + 50 / meters_per_deg_lon(23.78), 23.78)   # overlaps a by half
+        out = coalesce_rects([a, b], max_count=10, gap_m=30, max_inflation=1.5)
+        self.assertEqual(len(out), 1)
+        self.assertTrue(_covers(out[0], a) and _covers(out[0], b))
+
+    def test_every_input_stays_covered_when_merging_fits_the_limit(self):
+        # rows of touching boxes: merging them is cheap
+        rects = [_box(90.40 + 0.01 * row + k * 100 / meters_per_deg_lon(23.78), 23.78)
+                 for row in range(5) for k in range(8)]
+        out = coalesce_rects(rects, max_count=5, gap_m=30, max_inflation=1.5)
+        self.assertLessEqual(len(out), 5)
+        for r in rects:
+            self.assertTrue(any(_covers(o, r) for o in out), r)
+
+    def test_never_more_than_max_count(self):
+        rects = [_box(90.40 + 0.01 * k, 23.78 + 0.01 * (k % 3)) for k in range(40)]
+        out = coalesce_rects(rects, max_count=10, gap_m=30, max_inflation=1.5)
+        self.assertEqual(len(out), 10)
+
+    def test_newest_rects_are_kept_when_the_budget_runs_out(self):
+        # far apart, so no merge fits the inflation budget
+        rects = [_box(90.40 + 0.01 * k, 23.78) for k in range(12)]
+        out = coalesce_rects(rects, max_count=10, gap_m=30, max_inflation=1.5)
+        self.assertEqual(out, rects[2:])
+
+
+class ConflictGroupComponentTests(SimpleTestCase):
+    def test_union_find_merges_and_finds_roots(self):
+        uf = UnionFind(range(6))
+        uf.union(0, 1)
+        uf.union(2, 3)
+        uf.union(1, 3)
+        self.assertEqual(uf.find(0), uf.find(2))
+        self.assertNotEqual(uf.find(0), uf.find(4))
+        self.assertEqual(sorted(sorted(c) for c in uf.components()), [[0, 1, 2, 3], [4], [5]])
+
+    def test_union_by_size_keeps_the_larger_root(self):
+        uf = UnionFind(range(4))
+        uf.union(0, 1)
+        uf.union(0, 2)
+        root = uf.find(0)
+        self.assertEqual(uf.union(3, 0), root)
+
+    def test_removed_edge_splits_the_group_largest_first(self):
+        # a-b-c  d-e, with the c-d edge gone
+        comps = group_components("abcde", [("a", "b"), ("b", "c"), ("d", "e")])
+        self.assertEqual([sorted(c) for c in comps], [["a", "b", "c"], ["d", "e"]])
+
+    def test_members_left_without_edges_become_singletons(self):
+        comps = group_components("abc", [("a", "b")])
+        self.assertEqual([sorted(c) for c in comps], [["a", "b"], ["c"]])
+
+    def test_edges_to_works_outside_the_group_are_ignored(self):
+        comps = group_components("ab", [("a", "x"), ("x", "b")])
+        self.assertEqual(len(comps), 2)
+
+
+class SchedulingTests(SimpleTestCase):
+    def test_earliest_fit_uses_the_first_gap_that_is_long_enough(self):
+        busy = [(10, 12), (13, 20), (22, 25)]
+        self.assertEqual(earliest_fit(10, 1, busy), 12)
+        self.assertEqual(earliest_fit(10, 2, busy), 20)
+        self.assertEqual(earliest_fit(10, 3, busy), 25)
+        self.assertEqual(earliest_fit(0, 5, busy), 0)
+
+    def test_earliest_fit_gives_up_behind_an_open_ended_block(self):
+        self.assertIsNone(earliest_fit(10, 2, [(11, INF)]))
+
+    def test_conflicting_jobs_do_not_overlap(self):
+        jobs = [Job(k, duration=3, release=0, due=10) for k in "abc"]
+        solve_schedule(jobs, [("a", "b"), ("b", "c"), ("a", "c")])
+        spans = sorted((j.start, j.end) for j in jobs)
+        for (_, end), (start, _) in zip(spans, spans[1:]):
+            self.assertLessEqual(end, start)
+
+    def test_emergency_jobs_go_first(self):
+        jobs = [Job("routine", duration=5, release=0, due=4), Job("urgent", duration=5, release=0, due=4, emergency=True)]
+        result = solve_schedule(jobs, [("routine", "urgent")])
+        self.assertEqual(result, {"urgent": 0, "routine": 5})
+
+    def test_fixed_works_block_their_interval(self):
+        jobs = [Job("a", duration=2, release=0, due=10)]
+        self.assertEqual(solve_schedule(jobs, [], {"a": [(0, 4)]}), {"a": 4})
+        self.assertEqual(solve_schedule(jobs, [], {"a": [(1, INF)]}), {"a": None})
+
+    def test_stale_proposals_at_one_location_are_kept_apart(self):
+        # both windows lie in the past and did not overlap, so no conflict edge
+        # was ever stored; moved up to today they would collide
+        today = date(2025, 6, 1)
+        rows = [("a", "b", None, None), ("b", "a", None, None)]
+        edges, fixed = split_neighbours({"a", "b"}, rows)
+        self.assertEqual(edges, [("a", "b")])
+        jobs = [
+            Job("a", duration=5, release=max(date(2025, 1, 1), today).toordinal(), due=date(2025, 1, 5).toordinal()),
+            Job("b", duration=5, release=max(date(2025, 2, 1), today).toordinal(), due=date(2025, 2, 5).toordinal()),
+        ]
+        solve_schedule(jobs, edges, fixed)
+        a, b = sorted(jobs, key=lambda j: j.start)
+        self.assertLessEqual(a.end, b.start)
+
+    def test_neighbours_outside_the_job_set_are_fixed_intervals(self):
+        rows = [("a", "x", date(2025, 6, 1), date(2025, 6, 4)), ("a", "y", date(2025, 7, 1), None),
+                ("a", "z", None, None)]
+        edges, fixed = split_neighbours({"a"}, rows)
+        self.assertEqual(edges, [])
+        self.assertEqual(fixed, {"a": [(date(2025, 6, 1).toordinal(), date(2025, 6, 4).toordinal()),
+                                       (date(2025, 7, 1).toordinal(), INF)]})
+
+
+@skipIf(spu.np is None, "numpy is not installed")
+class CollisionEngineParityTests(SimpleTestCase):
+    def _both(self, specs, coords):
+        idx, rects = spu.build_rect_index_from_array_of_arrays(specs)
+        return (spu._path_collisions_scalar(idx, rects, coords),
+                spu._path_collisions_vectorized(idx, rects, coords))
+
+    def _assert_same(self, expected, got):
+        self.assertEqual(len(expected), len(got))
+        for e, g in zip(expected, got):
+            self.assertEqual((e["segment_index"], e["rect_id"]), (g["segment_index"], g["rect_id"]))
+            self.assertAlmostEqual(e["t"], g["t"], places=9)
+            self.assertAlmostEqual(e["hit_point"].x, g["hit_point"].x, places=9)
+            self.assertAlmostEqual(e["hit_point"].y, g["hit_point"].y, places=9)
+
+    def test_engines_report_the_same_records(self):
+        for seed in range(3):
+            coords = synthetic_route(400, seed=seed)
+            specs = synthetic_rects(coords, 120, seed=seed)
+            expected, got = self._both(specs, coords)
+            self.assertTrue(expected)
+            self._assert_same(expected, got)
+
+    def test_ties_go_to_the_first_stored_rect(self):
+        # the segment starts inside all three boxes, so every one is hit at t=0
+        specs = [[0.0, 0.0, 2.0, 2.0, 30], [-1.0, -1.0, 3.0, 3.0, 10], [0.5, 0.5, 1.5, 1.5, 20]]
+        expected, got = self._both(specs, [[1.0, 1.0], [5.0, 1.0]])
+        self._assert_same(expected, got)
+        self.assertEqual(expected[0]["rect_id"], 30)
+
+
+class PolylineTests(SimpleTestCase):
+    def test_encode_polyline_matches_the_reference_example(self):
+        coords = [(-120.2, 38.5), (-120.95, 40.7), (-126.453, 43.252)]
+        self.assertEqual(spu.encode_polyline(coords), "_p~iF~ps|U_ulLnnqC_mqNvxq`@")
+
+    def test_encode_polyline_precision_6_scales_the_deltas(self):
+        self.assertEqual(spu.encode_polyline([(-120.2, 38.5)], precision=6),
+                         spu.encode_polyline([(-1202.0, 385.0)], precision=5))
+        self.assertEqual(spu.encode_polyline([]), "")
+
+    def _max_deviation_m(self, coords, kept):
+        # distance of every input point to the kept polyline, in the metric simplify_coords uses
+        lat0 = sum(c[1] for c in coords) / len(coords)
+        kx, ky = meters_per_deg_lon(lat0), meters_per_deg_lat()
+        worst = 0.0
+        for x, y in coords:
+            worst = max(worst, min(
+                spu._seg_dist_m(x * kx, y * ky, a[0] * kx, a[1] * ky, b[0] * kx, b[1] * ky)
+                for a, b in zip(kept, kept[1:])
+            ))
+        return worst
+
+    def test_simplified_route_stays_within_tolerance(self):
+        coords = synthetic_route(500, seed=3)
+        for tolerance in (2.0, 10.0, 25.0):
+            kept = spu.simplify_coords(coords, tolerance)
+            self.assertEqual((kept[0], kept[-1]), (coords[0], coords[-1]))
+            self.assertLess(len(kept), len(coords))
+            self.assertLessEqual(self._max_deviation_m(coords, kept), tolerance + 1e-6)
+
+    def test_collinear_points_are_dropped_and_zero_tolerance_keeps_all(self):
+        line = [[90.40 + 0.001 * k, 23.78] for k in range(10)]
+        self.assertEqual(spu.simplify_coords(line, 1.0), [line[0], line[-1]])
+        self.assertEqual(spu.simplify_coords(line, 0), line)
+
+
+def _diamond_graph():
+    """
+    0 -> 1 -> 3 over a fast road (north), 0 -> 2 -> 3 over a slow one
+    (south), both one-way, plus a 3 -> 0 shortcut.
+    """
+    lon = [90.40, 90.41, 90.41, 90.42]
+    lat = [23.78, 23.79, 23.77, 23.78]
+    edges = []
+    for u, v, speed_ms in ((0, 1, 20.0), (1, 3, 20.0), (0, 2, 10.0), (2, 3, 10.0), (3, 0, 15.0)):
+        d = haversine_m(lon[u], lat[u], lon[v], lat[v])
+        edges.append((u, v, d, d / speed_ms))
+    return RoadGraph._from_edges(lon, lat, edges)
+
+
+class RoadGraphTests(SimpleTestCase):
+    def test_edges_are_laid_out_by_source_node(self):
+        graph = _diamond_graph()
+        self.assertEqual((graph.node_count, graph.edge_count), (4, 5))
+        self.assertEqual(list(graph.offsets), [0, 2, 3, 4, 5])
+        self.assertEqual(sorted(graph.target[e] for e in range(graph.offsets[0], graph.offsets[1])), [1, 2])
+
+    def test_shortest_path_takes_the_fastest_road(self):
+        graph = _diamond_graph()
+        path = graph.shortest_path(0, 3)
+        self.assertEqual(path, [0, 1, 3])
+        summary = graph.path_summary(path)
+        expected = (graph.length_m[0] + graph.length_m[2]) / 20.0
+        self.assertEqual(summary["travelTimeInSeconds"], round(expected))
+
+    def test_blocked_edge_reroutes_and_one_way_roads_are_respected(self):
+        graph = _diamond_graph()
+        fast = next(e for e in range(graph.offsets[0], graph.offsets[1]) if graph.target[e] == 1)
+        self.assertEqual(graph.shortest_path(0, 3, {fast}), [0, 2, 3])
+        self.assertEqual(graph.shortest_path(3, 1), [3, 0, 1])
+        self.assertIsNone(graph.shortest_path(1, 2, {e for e in range(graph.edge_count) if graph.target[e] == 0}))
+
+    def test_offline_route_goes_around_an_avoid_rectangle(self):
+        graph = _diamond_graph()
+        avoid = AvoidIndex([[90.408, 23.788, 90.412, 23.792]])   # around node 1
+        into_1 = {e for e in range(graph.edge_count) if graph.target[e] == 1}
+        out_of_1 = set(range(graph.offsets[1], graph.offsets[2]))
+        self.assertEqual(graph.blocked_edges(avoid), into_1 | out_of_1)
+        geometry, _, collisions = offline_route(avoid, "23.78,90.40", "23.78,90.42", graph=graph)
+        self.assertEqual(geometry["coordinates"], [[90.40, 23.78], [90.41, 23.77], [90.42, 23.78]])
+        self.assertEqual(collisions, [])
+
+    def test_solver_lists_the_rectangles_an_unavoidable_osm_route_crosses(self):
+        graph = _diamond_graph()
+        avoid = AvoidIndex([[90.418, 23.778, 90.422, 23.782]])   # around the destination
+        with override_settings(ROUTING_BACKEND="osm", ROUTE_CACHE={"ENABLED": False}), \
+                patch("base.api.road_graph.get_road_graph", return_value=graph):
+            stats = {}
+            resdata = spu.routeProbSolver(None, "23.78,90.40", "23.78,90.42", stats=stats, avoid_index=avoid)
+        self.assertEqual(stats["collisions"], 1)
+        remaining = resdata["features"][0]["properties"]["remainingCollisions"]
+        self.assertEqual([r["rect"] for r in remaining], [avoid.specs[0]])
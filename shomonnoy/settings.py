@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'rest_framework',
     "rest_framework_simplejwt",
     'django.contrib.gis',
+    'django.contrib.postgres',
     'corsheaders',
 ]
 
@@ -166,5 +167,81 @@ SIMPLE_JWT = {
 
 AUTH_USER_MODEL = 'base.User'
 
+# Works whose locations come within this many metres of each other (without
+# intersecting) are flagged as "Near" conflicts. 0 disables proximity checks.
+# Run `manage.py rebuild_conflicts` after changing it.
+CONFLICT_BUFFER_METERS = config('CONFLICT_BUFFER_METERS', default=5.0, cast=float)
+
+# "default" is per process. "shared" is seen by every worker: a table in the
+# main database unless SHARED_CACHE_BACKEND/LOCATION point elsewhere (e.g.
+# django.core.cache.backends.redis.RedisCache and a redis:// URL). The table
+# is created by `manage.py createcachetable`.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": {
+        "BACKEND": config('SHARED_CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        "LOCATION": config('SHARED_CACHE_LOCATION', default='shomonnoy_cache'),
+    },
+}
+
+# Solved routes for /api/shortrouting/ (see base/api/route_cache.py).
+# "local" is a per-worker LRU; "django" stores them in the CACHES alias
+# named by ALIAS.
+ROUTE_CACHE = {
+    "BACKEND": config('ROUTE_CACHE_BACKEND', default='local'),
+    "ALIAS": "shared",
+    "TTL": config('ROUTE_CACHE_TTL', default=120, cast=int),
+    "MAX_ENTRIES": config('ROUTE_CACHE_MAX_ENTRIES', default=512, cast=int),
+    "TRAFFIC_BUCKET_SECONDS": 300,
+    "COORD_PRECISION": 4,
+}
+
+# TomTom Orbis routing key for /api/shortrouting/ (read from the environment
+# or .env, never committed).
+TOMTOM_API_KEY = config('TOMTOM_API_KEY', default='')
+
+# Point at `manage.py tomtom_standin` (e.g. http://127.0.0.1:8765/maps/orbis/routing/calculateRoute)
+# to load-test routing without spending API quota; empty means the real API.
+TOMTOM_BASE_URL = config('TOMTOM_BASE_URL', default='')
+
+# Where routes come from: "tomtom" (Orbis API) or "osm", a local road graph
+# loaded from ROAD_GRAPH_PATH (an OSM XML extract or a .graph file written by
+# `manage.py build_road_graph`).
+ROUTING_BACKEND = config('ROUTING_BACKEND', default='tomtom')
+ROAD_GRAPH_PATH = config('ROAD_GRAPH_PATH', default='')
+
+# /api/shortrouting/batch/: pairs per request and how many are solved at
+# once against TomTom (bounded by the HTTP connection pool size, 16).
+ROUTE_BATCH_MAX_PAIRS = config('ROUTE_BATCH_MAX_PAIRS', default=100, cast=int)
+ROUTE_BATCH_CONCURRENCY = config('ROUTE_BATCH_CONCURRENCY', default=4, cast=int)
+ROUTE_BATCH_MAX_CONCURRENCY = 16
+
+# Wall-clock budget of one routing request (single or batch), and the most a
+# client may ask for via "time_budget". TomTom timeouts shrink to fit it and
+# the best route found so far is returned once it runs out; keep it below
+# the gunicorn worker timeout (30 s by default).
+ROUTE_TIME_BUDGET_SECONDS = config('ROUTE_TIME_BUDGET_SECONDS', default=20.0, cast=float)
+
+# Built avoid-rectangle rtrees, per worker and (city, statuses, distinct)
+# filter; dropped on Work/Location writes (see base/api/avoid_index.py). The
+# version counter those writes bump lives in the ALIAS cache, which must be
+# shared for a write to reach every worker.
+AVOID_INDEX = {
+    "ENABLED": config('AVOID_INDEX_CACHE', default=True, cast=bool),
+    "ALIAS": "shared",
+    "TTL": config('AVOID_INDEX_TTL', default=300, cast=int),
+    "MAX_ENTRIES": 32,
+}
+
+# avoidAreas sent to TomTom: overlapping rectangles are coalesced down to
+# MAX_RECTS while keeping the covered area within MAX_INFLATION x the original.
+AVOID_AREAS = {
+    "MAX_RECTS": config('AVOID_MAX_RECTS', default=10, cast=int),
+    "MERGE_GAP_METERS": 30.0,
+    "MAX_INFLATION": config('AVOID_MAX_INFLATION', default=1.5, cast=float),
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file